@@ -2,6 +2,11 @@ from fastapi import APIRouter, status
 from pydantic import BaseModel
 from app.core.config import settings
 from app.utils.logger import get_logger
+from app.utils.user_cache import user_cache
+from app.core.queue_metrics import queue_metrics
+from app.core.cache_metrics import embedding_cache_metrics
+from app.core.task_queues import PRIORITY_CLASSES
+from typing import Dict, Optional
 
 logger = get_logger("health_api")
 
@@ -28,4 +33,67 @@ async def health_check():
         status="ok",
         version=settings.APP_VERSION,
         service_name=settings.APP_NAME
-    )
\ No newline at end of file
+    )
+
+class CacheStats(BaseModel):
+    """Hit/miss counters of an in-process cache."""
+    hits: int
+    misses: int
+    hit_rate: float
+    entries: int
+
+
+class HealthStatsResponse(BaseModel):
+    """Runtime statistics of this API process."""
+    user_cache: CacheStats
+
+
+@router.get("/stats", response_model=HealthStatsResponse)
+async def health_stats():
+    """
+    Runtime statistics of this API process (counters are per process).
+    
+    Returns:
+        HealthStatsResponse: Cache statistics
+    """
+    return HealthStatsResponse(user_cache=CacheStats(**user_cache.stats()))
+
+
+class QueueStats(BaseModel):
+    """Backlog and wait times of a priority class (waits from message creation to claim by a worker)."""
+    depth: int
+    processed: int
+    mean_wait_seconds: Optional[float] = None
+    p50_wait_seconds: Optional[float] = None
+    p95_wait_seconds: Optional[float] = None
+    max_recent_wait_seconds: Optional[float] = None
+
+
+@router.get("/queues", response_model=Dict[str, QueueStats])
+async def queue_stats():
+    """
+    Per priority class queue depth and wait times, as recorded by all workers.
+    
+    Returns:
+        Dict[str, QueueStats]: Stats keyed by priority class
+    """
+    return {priority: QueueStats(**await queue_metrics.snapshot(priority)) for priority in PRIORITY_CLASSES}
+
+
+class EmbeddingCacheStats(BaseModel):
+    """Hit/miss counters of the embedding cache, summed over all workers (disk_hits are included in hits)."""
+    hits: int
+    disk_hits: int
+    misses: int
+    hit_rate: float
+
+
+@router.get("/embedding_cache", response_model=EmbeddingCacheStats)
+async def embedding_cache_stats():
+    """
+    Embedding cache lookups, as recorded by all workers.
+    
+    Returns:
+        EmbeddingCacheStats: Cache statistics
+    """
+    return EmbeddingCacheStats(**await embedding_cache_metrics.snapshot())
@@ -1,9 +1,12 @@
 from app.core.config import settings
 from app.utils.logger import get_logger
-from app.dtos.neuro_chat_dtos import GetMessagesStatusResponse, GetChatResponse, MessageList, SendMessageRequest, SendMessageResponse, GetMessagesStatusRequest
-from app.core.neuro_chat_service import get_user_messages, send_message_to_system, get_messages_status
+from app.dtos.neuro_chat_dtos import GetMessagesStatusResponse, GetChatResponse, MessageList, SendMessageRequest, SendMessageResponse, SendMessagesRequest, SendMessagesResponse, GetMessagesStatusRequest
+from app.core.neuro_chat_service import get_user_messages, send_message_to_system, send_messages_to_system, get_messages_status, stream_messages_status
+from app.dtos.error_success_codes import ErrorAndSuccessCodes
+from app.utils.generic_utils import decode_page_cursor
 
-from fastapi import APIRouter, Query
+from fastapi import APIRouter, Query, Request
+from fastapi.responses import StreamingResponse
 from typing import List, Optional
 import psutil
 
@@ -12,15 +15,20 @@ logger = get_logger("neuro_chat")
 router = APIRouter(tags=["NeuroChat"])
 
 @router.get("/getChat", response_model=GetChatResponse)
-async def get_messages(user_id : str = Query(...), page_number : int = Query(1, ge=1, description="Page number starting from 1")):
+async def get_messages(user_id : str = Query(...), page_number : int = Query(1, ge=1, description="Page number starting from 1"),
+                       cursor : Optional[str] = Query(None, description="next_cursor of the previous page, takes precedence over page_number")):
     '''
         Fetches chat messages from DB
     '''
-    logger.info(f"Chat History requested, User ID: {user_id}, Page Number: {page_number}")
-    result : List[MessageList] = await get_user_messages(user_id, page_number)
+    logger.info(f"Chat History requested, User ID: {user_id}, Page Number: {page_number}, Cursor: {cursor}")
+    if cursor and decode_page_cursor(cursor) is None:
+        # Not an empty last page: the client must not take a corrupted cursor for the end of the chat
+        return GetChatResponse(status="error", data=[], internal_status_code=ErrorAndSuccessCodes.INVALID_INPUT)
+    result, next_cursor = await get_user_messages(user_id, page_number, cursor)
     return GetChatResponse(
         status="ok",
-        data=result
+        data=result,
+        next_cursor=next_cursor
     )
 
 @router.post("/sendMessage", response_model=SendMessageResponse)
@@ -32,6 +40,15 @@ async def send_message(request: SendMessageRequest):
     result: SendMessageResponse = await send_message_to_system(request)
     return result
 
+@router.post("/sendMessages", response_model=SendMessagesResponse)
+async def send_messages(request: SendMessagesRequest):
+    '''
+        Sends messages in bulk, returns the message_id and status of each one
+    '''
+    logger.info(f"Bulk message sending requested, Messages: {len(request.messages)}")
+    result: SendMessagesResponse = await send_messages_to_system(request)
+    return result
+
 @router.post("/getMessagesStatus", response_model=GetMessagesStatusResponse)
 async def send_message(request: GetMessagesStatusRequest):
     '''
@@ -39,4 +56,16 @@ async def send_message(request: GetMessagesStatusRequest):
     '''
     logger.info(f"Message statusses requested, User ID: {request.user_id}, Message IDS: {request.message_ids}")
     result: GetMessagesStatusResponse = await get_messages_status(request)
-    return result
\ No newline at end of file
+    return result
+
+@router.get("/streamMessagesStatus")
+async def stream_status(request: Request, user_id : str = Query(...)):
+    '''
+        Pushes status of the user's messages as Server-Sent Events (replaces polling getMessagesStatus)
+    '''
+    logger.info(f"Message status stream requested, User ID: {user_id}")
+    return StreamingResponse(
+        stream_messages_status(user_id, request.is_disconnected),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
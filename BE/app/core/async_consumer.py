@@ -0,0 +1,230 @@
+'''
+    Asyncio-native message consumer, alternative to the Celery worker.
+
+    One long-lived event loop per process pulls process_message(s)_task messages from the
+    same Redis broker queues Celery uses. Each priority class (see task_queues) has its own
+    consumer and concurrency limit (INTERACTIVE_CONCURRENCY, BULK_CONCURRENCY), both share the
+    process resources. The shards of a class are read round robin for per-user fairness.
+    The Celery worker (app.core.worker) stays available as a fallback,
+    both can consume the queues side by side.
+
+    Late acks: a message is atomically moved from its queue to this consumer's unacked list
+    (LMOVE) and removed from it only once its pipeline completed. Messages left in the
+    unacked lists by a crash are requeued when a consumer with the same ASYNC_CONSUMER_ID starts.
+    Messages that must be delivered again (transient error, lease of a previous attempt still
+    active) stay in the unacked list until they are requeued after their delay.
+
+    Run from BE/:
+        python -m app.core.async_consumer
+'''
+from app.core.config import settings
+from app.core.celery_worker_service import MessageRetryError, process_message_inside_task_queue, process_messages_inside_task_queue
+from app.core.worker import initialize_resources, process_message_task, process_messages_task
+from app.core.write_coalescer import write_coalescer
+from app.core.queue_metrics import queue_metrics
+from app.core.cache_metrics import embedding_cache_metrics
+from app.core.task_queues import BULK, INTERACTIVE, queue_names
+from app.core.warmup import clear_ready
+from app.utils.db_connect import mongodb
+from app.utils.logger import get_logger
+
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+import asyncio
+import base64
+import json
+import signal
+
+logger = get_logger("async_consumer")
+
+
+def decode_task_message(raw_message: str) -> Tuple[Optional[str], List[Any], Dict[str, Any]]:
+    """
+    Decode a Celery (kombu) message stored in the Redis broker queue.
+    Returns:
+        Tuple of task name, args and kwargs
+    """
+    envelope = json.loads(raw_message)
+    body = envelope["body"]
+    if envelope.get("properties", {}).get("body_encoding") == "base64":
+        body = base64.b64decode(body).decode("utf-8")
+    payload = json.loads(body)
+
+    headers = envelope.get("headers") or {}
+    if "task" in headers:
+        # Message protocol 2: body is [args, kwargs, embed]
+        args, kwargs = payload[0], payload[1]
+        return headers["task"], args, kwargs
+    # Message protocol 1: task name and arguments are in the body
+    return payload.get("task"), payload.get("args", []), payload.get("kwargs", {})
+
+
+class AsyncTaskConsumer:
+    """
+    Pulls task messages from broker queues, round robin, and runs their handlers with bounded concurrency.
+    """
+
+    # Wait before polling again when all queues are empty
+    POLL_INTERVAL_SECONDS = 0.1
+
+    def __init__(self, broker_url: str, queues: List[str], consumer_id: str, concurrency: int):
+        self.broker_url = broker_url
+        self.queues = queues
+        self.consumer_id = consumer_id
+        self.next_queue = 0
+        self.concurrency = max(1, concurrency)
+        self.handlers: Dict[str, Callable[..., Awaitable[Any]]] = {}
+        self.client = None
+        self.in_flight: Set[asyncio.Task] = set()
+        self.delayed: Set[asyncio.Task] = set()
+        self.stopping = asyncio.Event()
+
+    def unacked_queue(self, queue: str) -> str:
+        return f"{queue}.unacked.{self.consumer_id}"
+
+    def register(self, task_name: str, handler: Callable[..., Awaitable[Any]]) -> None:
+        """
+        Register the coroutine function run for messages of a Celery task.
+        """
+        self.handlers[task_name] = handler
+
+    async def requeue_unacked(self) -> None:
+        """
+        Give back messages a previous run of this consumer took but never acknowledged.
+        """
+        for queue in self.queues:
+            requeued = 0
+            while await self.client.lmove(self.unacked_queue(queue), queue, "RIGHT", "RIGHT") is not None:
+                requeued += 1
+            if requeued:
+                logger.warning(f"Requeued {requeued} unacknowledged messages from {self.unacked_queue(queue)}")
+
+    async def pull(self) -> Optional[Tuple[str, str]]:
+        """
+        Take the next message, trying the queues round robin so that no shard starves the others.
+        Returns:
+            Tuple of queue and raw message, None if all queues are empty
+        """
+        for _ in range(len(self.queues)):
+            queue = self.queues[self.next_queue]
+            self.next_queue = (self.next_queue + 1) % len(self.queues)
+            # Kombu pushes on the left and pops on the right, keep its FIFO order
+            raw_message = await self.client.lmove(queue, self.unacked_queue(queue), "RIGHT", "LEFT")
+            if raw_message is not None:
+                return queue, raw_message
+        return None
+
+    async def requeue_later(self, queue: str, raw_message: str, delay: float) -> None:
+        """
+        Move a message from the unacked list back to its queue after `delay` seconds.
+        Cancelled on shutdown, the message then stays in the unacked list and is requeued on the next start.
+        """
+        await asyncio.sleep(delay)
+        async with self.client.pipeline(transaction=True) as pipe:
+            # Back at the tail, kombu pushes on the left
+            pipe.lpush(queue, raw_message)
+            pipe.lrem(self.unacked_queue(queue), 1, raw_message)
+            await pipe.execute()
+
+    async def handle(self, queue: str, raw_message: str, slots: asyncio.Semaphore) -> None:
+        delay = None
+        try:
+            task_name, args, kwargs = decode_task_message(raw_message)
+            handler = self.handlers.get(task_name)
+            if handler is None:
+                logger.error(f"No handler registered for task {task_name}, dropping message")
+            else:
+                result = await handler(*args, **kwargs)
+                logger.info(f"Task {task_name}{tuple(args)} completed: {result}")
+        except MessageRetryError as e:
+            # Nothing recorded: deliver the task again once the lease expired (or after a backoff).
+            # Messages of a bulk task that were processed are skipped by their claim on redelivery
+            delay = e.countdown if e.countdown is not None else settings.MESSAGE_RETRY_MAX_DELAY_SECONDS
+            logger.warning(f"Requeueing message from {queue} in {delay:.0f}s: {str(e)}")
+        except Exception as e:
+            logger.error(f"Error handling message from {queue}: {str(e)}")
+        finally:
+            try:
+                if delay is None:
+                    # Late ack, the pipeline has completed (or failed and recorded its error status)
+                    await self.client.lrem(self.unacked_queue(queue), 1, raw_message)
+                else:
+                    # Without holding the slot, the wait can last a whole lease
+                    task = asyncio.create_task(self.requeue_later(queue, raw_message, delay))
+                    self.delayed.add(task)
+                    task.add_done_callback(self.delayed.discard)
+            finally:
+                slots.release()
+
+    async def run(self) -> None:
+        import redis.asyncio as aioredis
+        self.client = aioredis.from_url(self.broker_url, decode_responses=True)
+        await self.requeue_unacked()
+
+        slots = asyncio.Semaphore(self.concurrency)
+        logger.info(f"Consuming {', '.join(self.queues)} with concurrency {self.concurrency}")
+        try:
+            while not self.stopping.is_set():
+                await slots.acquire()
+                pulled = await self.pull()
+                if pulled is None:
+                    slots.release()
+                    await asyncio.sleep(self.POLL_INTERVAL_SECONDS)
+                    continue
+                task = asyncio.create_task(self.handle(*pulled, slots))
+                self.in_flight.add(task)
+                task.add_done_callback(self.in_flight.discard)
+        finally:
+            if self.in_flight:
+                logger.info(f"Waiting for {len(self.in_flight)} in-flight messages")
+                await asyncio.gather(*self.in_flight, return_exceptions=True)
+            # Still in the unacked list, requeued on the next start
+            for task in list(self.delayed):
+                task.cancel()
+            await asyncio.gather(*self.delayed, return_exceptions=True)
+            await self.client.close()
+
+    def stop(self) -> None:
+        logger.info("Stopping consumer, no new messages will be pulled")
+        self.stopping.set()
+
+
+async def main() -> None:
+    consumers = [
+        AsyncTaskConsumer(
+            settings.BROKER_URL,
+            queues=queue_names(INTERACTIVE),
+            consumer_id=settings.ASYNC_CONSUMER_ID,
+            concurrency=settings.INTERACTIVE_CONCURRENCY
+        ),
+        AsyncTaskConsumer(
+            settings.BROKER_URL,
+            queues=queue_names(BULK),
+            consumer_id=settings.ASYNC_CONSUMER_ID,
+            concurrency=settings.BULK_CONCURRENCY
+        ),
+    ]
+    for consumer in consumers:
+        consumer.register(process_message_task.name, process_message_inside_task_queue)
+        consumer.register(process_messages_task.name, process_messages_inside_task_queue)
+
+    def stop_consumers():
+        for consumer in consumers:
+            consumer.stop()
+
+    loop = asyncio.get_running_loop()
+    for signal_number in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signal_number, stop_consumers)
+
+    await initialize_resources()
+    try:
+        await asyncio.gather(*(consumer.run() for consumer in consumers))
+    finally:
+        clear_ready()
+        await write_coalescer.flush()
+        await queue_metrics.close()
+        await embedding_cache_metrics.close()
+        await mongodb.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,58 @@
+from app.core.config import settings
+from app.utils.logger import get_logger
+
+from typing import Any, Dict
+
+logger = get_logger("cache_metrics")
+
+
+class CacheMetrics:
+    """
+    Hit/miss counters of the embedding cache, summed over every worker process.
+    The cache lives in the workers, they record each lookup into Redis and the API reports
+    the totals (like queue_metrics), so the numbers survive worker restarts too.
+    """
+
+    KEY = "neuro_chat:embedding_cache"
+
+    def __init__(self, url: str):
+        self.url = url
+        self.client = None
+
+    def get_client(self):
+        if self.client is None:
+            import redis.asyncio as aioredis
+            self.client = aioredis.from_url(self.url, decode_responses=True)
+        return self.client
+
+    async def record(self, hit: bool, disk_hit: bool = False) -> None:
+        """
+        Record one cache lookup. Best effort, never fails the pipeline.
+        """
+        try:
+            async with self.get_client().pipeline(transaction=False) as pipe:
+                pipe.hincrby(self.KEY, "hits" if hit else "misses", 1)
+                if disk_hit:
+                    pipe.hincrby(self.KEY, "disk_hits", 1)
+                await pipe.execute()
+        except Exception as e:
+            logger.error(f"Failed to record embedding cache lookup: {str(e)}")
+
+    async def snapshot(self) -> Dict[str, Any]:
+        totals = await self.get_client().hgetall(self.KEY)
+        hits = int(totals.get("hits", 0))
+        misses = int(totals.get("misses", 0))
+        return {
+            "hits": hits,
+            "disk_hits": int(totals.get("disk_hits", 0)),
+            "misses": misses,
+            "hit_rate": hits / (hits + misses) if hits + misses else 0.0
+        }
+
+    async def close(self) -> None:
+        if self.client is not None:
+            await self.client.close()
+            self.client = None
+
+
+embedding_cache_metrics = CacheMetrics(settings.BROKER_URL)
@@ -2,43 +2,232 @@ from app.dtos.collection_names import CollectionNames
 from app.dtos.error_success_codes import ErrorAndSuccessCodes
 from app.utils.db_query import MongoQueryApplicator
 from app.utils.logger import get_logger
-from app.core.embeddings_config import embeddings
-from app.core.pinecone_config import pinecone
-from app.core.llm import get_llm_response
+from app.core.embedding_batcher import embedding_batcher
+from app.core.vector_store import vector_store
+from app.core.write_coalescer import write_coalescer
+from app.core.config import settings
+from app.core.llm import get_llm_response, llm_service, stream_llm_response
+from app.core.inference_scheduler import get_batched_llm_response
+from app.core.pubsub import pubsub, message_status_channel
+from app.core.queue_metrics import queue_metrics
+from app.core.task_queues import BULK, INTERACTIVE
 
 from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo.errors import PyMongoError
 from typing import Optional, List, Dict, Any
-from datetime import datetime
+from datetime import datetime, timedelta
 import asyncio
+import os
+import socket
+import uuid
 
 logger = get_logger("celery_worker_service")
 
+# Fields of the processed message used by the pipeline
+MESSAGE_PROJECTION = {"user_id": 1, "user_message": 1, "created_at": 1}
 
-async def validate_message_id(message_id: str) -> Optional[Dict[str, Any]]:
+
+class MessageRetryError(Exception):
+    """
+    Messages could not be claimed because of a transient error (e.g. Mongo unreachable)
+    or because another attempt still holds their lease.
+    Nothing was recorded for them, they must be delivered again: the Celery tasks retry,
+    the async consumer requeues the task message.
+    `countdown` is the delay before the next delivery when it is known (lease expiry),
+    None to back off.
     """
-    Validate if the message_id exists in the chats collection.
+
+    def __init__(self, message_ids: List[str], cause: Exception, countdown: Optional[float] = None):
+        super().__init__(f"Transient error on messages {message_ids}: {repr(cause)}")
+        self.message_ids = message_ids
+        self.countdown = countdown
+
+
+async def claim_message(message_id: str, owner: str) -> Optional[Dict[str, Any]]:
+    """
+    Atomically claim a message for processing: MESSAGE_UNDER_PROCESSING (or MESSAGE_IN_PROGRESS
+    with an expired lease, abandoned by a dead worker) becomes MESSAGE_IN_PROGRESS owned by `owner`
+    for MESSAGE_LEASE_SECONDS. Deliveries of a message already processed (or failed) are skipped
+    before any embedding or generation. A delivery of a message whose lease is still active is
+    not skipped: the holder may be dead (e.g. its task was requeued when the consumer restarted),
+    so the delivery is retried once the lease expires, when it either finds the message
+    processed or reclaims the abandoned lease.
     Args:
-        message_id: The _id of the message to validate
+        message_id: The _id of the message to claim
+        owner: Unique id of this processing attempt
     Returns:
-        Optional[Dict]: The message document if found, None otherwise
+        Optional[Dict]: The message document if claimed, None otherwise
+    Raises:
+        MessageRetryError: Mongo error or lease still active, the message must be delivered again
     """
     try:
+        now = datetime.now()
         mongo = MongoQueryApplicator(CollectionNames.CHAT.value)
-        message_doc = await mongo.find_one({"_id": ObjectId(message_id)})
-        
-        if not message_doc:
+        message_doc = await mongo.find_one_and_update(
+            {
+                "_id": ObjectId(message_id),
+                "$or": [
+                    {"system_message_status": ErrorAndSuccessCodes.MESSAGE_UNDER_PROCESSING.value},
+                    {
+                        "system_message_status": ErrorAndSuccessCodes.MESSAGE_IN_PROGRESS.value,
+                        "lease_expires_at": {"$lt": now}
+                    }
+                ]
+            },
+            {
+                "system_message_status": ErrorAndSuccessCodes.MESSAGE_IN_PROGRESS.value,
+                "processing_owner": owner,
+                "lease_expires_at": now + timedelta(seconds=settings.MESSAGE_LEASE_SECONDS),
+                "updated_at": now
+            },
+            MESSAGE_PROJECTION
+        )
+        if message_doc:
+            logger.info(f"Message {message_id} claimed by {owner}")
+            return message_doc
+
+        current = await mongo.find_one(
+            {"_id": ObjectId(message_id)},
+            {"system_message_status": 1, "processing_owner": 1, "lease_expires_at": 1}
+        )
+        if not current:
             logger.warning(f"Message not found with ID: {message_id}")
             return None
-            
-        logger.info(f"Message validated successfully: {message_id}")
-        return message_doc
+        status = current.get("system_message_status")
+        lease_expires_at = current.get("lease_expires_at")
+        if status == ErrorAndSuccessCodes.MESSAGE_IN_PROGRESS.value and lease_expires_at:
+            # Lease held by another attempt, alive or not: deliver again once it has expired
+            countdown = max(1.0, (lease_expires_at - datetime.now()).total_seconds() + 1)
+            logger.info(f"Message {message_id} leased by {current.get('processing_owner')}, retrying in {countdown:.0f}s")
+            raise MessageRetryError(
+                [message_id],
+                RuntimeError(f"lease held by {current.get('processing_owner')} until {lease_expires_at}"),
+                countdown
+            )
+        logger.info(f"Skipping duplicate delivery of message {message_id}, status: {status}, owner: {current.get('processing_owner')}")
+        return None
+        
+    except InvalidId:
+        logger.error(f"Invalid message ID: {message_id}")
+        return None
+    except PyMongoError as e:
+        logger.error(f"Error claiming message ID {message_id}: {str(e)}")
+        raise MessageRetryError([message_id], e) from e
+    
+async def notify_message_status(user_id: Optional[Any], message_id: str, status: ErrorAndSuccessCodes, system_response: str) -> None:
+    """
+    Push the final status of a message to subscribed clients.
+    Best effort: clients can still fall back to getMessagesStatus.
+    """
+    if not user_id:
+        return
+    try:
+        await pubsub.publish(message_status_channel(str(user_id)), {
+            "type": "status",
+            "message_id": message_id,
+            "status": status.value,
+            "system_response": system_response
+        })
+    except Exception as e:
+        logger.error(f"Error publishing status for message {message_id}: {str(e)}")
+
+async def find_semantic_cache_hit(query_response: Any, user_id: Optional[Any]) -> Optional[Dict[str, Any]]:
+    """
+    Semantic response cache lookup.
+    If the best vector match is above SEMANTIC_CACHE_THRESHOLD and that message was answered
+    successfully (by the same user, for the "user" scope), its answer can be reused.
+    Args:
+        query_response: Vector store query response, matches sorted by score
+        user_id: Owner of the message being processed
+    Returns:
+        Optional[Dict]: The cached message document, None on a miss
+    """
+    if not settings.SEMANTIC_CACHE_ENABLED or not query_response.matches:
+        return None
+    
+    best_match = query_response.matches[0]
+    if best_match.score is None or best_match.score < settings.SEMANTIC_CACHE_THRESHOLD:
+        return None
+    
+    try:
+        filters = {
+            "_id": ObjectId(best_match.id),
+            "system_message_status": ErrorAndSuccessCodes.MESSAGE_PROCESSING_SUCCESS.value
+        }
+        if settings.SEMANTIC_CACHE_SCOPE == "user":
+            filters["user_id"] = user_id
         
+        mongo = MongoQueryApplicator(CollectionNames.CHAT.value)
+        cached_doc = await mongo.find_one(filters, {"system_message": 1})
     except Exception as e:
-        logger.error(f"Error validating message ID {message_id}: {str(e)}")
+        logger.error(f"Error looking up semantic cache for match {best_match.id}: {str(e)}")
+        return None
+    
+    if not cached_doc or not cached_doc.get("system_message"):
         return None
     
-async def get_related_messages(related_message_ids: List[str]):
+    logger.info(f"Semantic cache hit on message {best_match.id} with score {best_match.score:.4f}")
+    return cached_doc
+
+async def generate_streamed_response(user_id: Optional[Any], message_id: str, user_message: str, system_messages: List[Dict[str, str]]) -> str:
+    """
+    Generate the system response while pushing partial output to subscribed clients.
+    Returns:
+        str: The complete (cleaned) system response
+    """
+    channel = message_status_channel(str(user_id))
+    
+    async def publish_token(text: str):
+        try:
+            await pubsub.publish(channel, {
+                "type": "token",
+                "message_id": message_id,
+                "text": text
+            })
+        except Exception as e:
+            logger.error(f"Error publishing partial response for message {message_id}: {str(e)}")
+    
+    return await stream_llm_response(user_message, system_messages, on_token=publish_token)
+
+def build_vector_filter(user_id: Optional[Any]) -> Optional[Dict[str, Any]]:
+    """
+    Metadata filter scoping vector search to the user's own history
+    (VECTOR_SEARCH_SCOPE=user), optionally limited to VECTOR_RECENCY_WINDOW_DAYS.
+    Returns:
+        Optional[Dict]: Pinecone style filter, None to search the whole index
+    """
+    filter_dict = {}
+    if settings.VECTOR_SEARCH_SCOPE == "user" and user_id:
+        filter_dict["user_id"] = {"$eq": str(user_id)}
+    if settings.VECTOR_RECENCY_WINDOW_DAYS > 0:
+        window_start = datetime.now() - timedelta(days=settings.VECTOR_RECENCY_WINDOW_DAYS)
+        filter_dict["created_at"] = {"$gte": window_start.timestamp()}
+    return filter_dict or None
+
+def build_vector_metadata(message_doc: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Metadata stored with a message vector, used by build_vector_filter.
+    """
+    created_at = message_doc.get("created_at") or datetime.now()
+    return {
+        "user_id": str(message_doc.get("user_id", "")),
+        "created_at": created_at.timestamp()
+    }
+
+async def get_related_messages(related_message_ids: List[str], user_id: Optional[Any] = None,
+                               scores: Optional[Dict[str, float]] = None):
+    """
+    Previous user-system pairs of the related messages, as LLM context.
+    Args:
+        related_message_ids: Message ids returned by the vector search
+        user_id: Owner of the message being processed
+        scores: Vector search score per message id, kept on each pair so the prompt builder adds the most relevant first
+    Returns:
+        List[Dict]: {"user", "system", "score", "token_ids"} pairs
+    """
     related_messages = []
+    scores = scores or {}
 
     if not related_message_ids:
         logger.error("No related message IDs found")
@@ -55,11 +244,11 @@ async def get_related_messages(related_message_ids: List[str]):
             continue
     
     if object_ids:
-        # Query messages with the ObjectIds
-        related_messages = await mongo.find(
-            {"_id": {"$in": object_ids}},
-            limit=5
-        )
+        # Query messages with the ObjectIds, only from the user's own chats when search is user scoped
+        filters = {"_id": {"$in": object_ids}}
+        if settings.VECTOR_SEARCH_SCOPE == "user" and user_id:
+            filters["user_id"] = user_id
+        related_messages = await mongo.find(filters, limit=5, projection={"user_message": 1, "system_message": 1, "context_token_ids": 1})
     
     if len(related_messages) == 0:
         logger.error("No related messages found")
@@ -70,120 +259,185 @@ async def get_related_messages(related_message_ids: List[str]):
         if msg.get("system_message"):
             system_messages.append({
                 "user" : msg.get("user_message", ""),
-                "system" : msg.get("system_message", "")
+                "system" : msg.get("system_message", ""),
+                "score" : scores.get(str(msg["_id"])),
+                "token_ids" : msg.get("context_token_ids")
             })
     return system_messages
 
 
-async def process_message_inside_task_queue(message_id: str):
+async def process_message_inside_task_queue(message_id: str, priority: str = INTERACTIVE):
     """
     Process message inside Celery task queue.
     
     Steps:
-    1. Validate message_id exists in chats collection
+    1. Claim the message (atomic status transition with a lease, skips duplicate deliveries)
     2. Convert user message to vector embeddings
-    3. Query Pinecone for top 5 similar vectors
-    4. Extract message IDs from Pinecone results
-    5. Fetch related messages from chats collection
-    6. Create system response from related messages
-    7. Update original message with system response
+    3. Query the vector store (Pinecone or local) for top 5 similar vectors of the user
+    4. Extract message IDs from vector store results
+    5. Reuse the answer of a near-duplicate question (semantic cache, opt-in)
+    6. Fetch related messages from chats collection
+    7. Create system response from related messages
+    8. Update original message with system response (buffered, see write_coalescer)
+    9. Upsert the message vector to the vector store (buffered, see write_coalescer)
     
     Args:
         message_id: The _id of the message in chats collection
+        priority: Priority class the message was queued in, for the wait time metrics
         
     Returns:
         str: Status message
+    Raises:
+        MessageRetryError: The message could not be claimed, it must be delivered again
     """
+    user_id = None
+    owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
     try:
-        # Step 1: Validate message_id exists in chats collection
-        message_doc = await validate_message_id(message_id)
+        # Step 1: Claim the message, skips unknown ids and messages already processed
+        message_doc = await claim_message(message_id, owner)
         if not message_doc:
-            logger.error(f"Invalid message ID: {message_id}")
-            return "Invalid message ID"
+            return "Message not claimed"
+        if message_doc.get("created_at"):
+            await queue_metrics.record(priority, (datetime.now() - message_doc["created_at"]).total_seconds())
         
+        user_id = message_doc.get("user_id")
         user_message = message_doc.get("user_message", "")
         if not user_message:
-            logger.error(f"No user message found for ID: {message_id}")
-            return "No user message found"
+            # Terminal, recorded as failed below so the message does not stay in progress
+            raise ValueError(f"No user message found for ID: {message_id}")
         
         logger.info(f"Processing message: {user_message[:50]}...")
         
-        # Step 2: Convert user message to vector embeddings
-        embeddings_model = await embeddings.initialize_embeddings()
-        message_vector = embeddings_model.embed_query(user_message)
+        # Step 2: Convert user message to vector embeddings (batched with other in-flight messages)
+        message_vector = await embedding_batcher.embed(user_message)
         
         logger.info(f"Generated embeddings for message: {message_id}")
         
-        # Step 3: Query Pinecone for top 5 similar vectors
-        query_response = await pinecone.query_vectors(
+        # Step 3: Query the vector store for top 5 similar vectors
+        query_response = await vector_store.query_vectors(
             vector=message_vector,
             top_k=5,
+            filter_dict=build_vector_filter(user_id),
             include_metadata=True
         )
         
-        logger.info(f"Pinecone query returned {len(query_response.matches)} matches")
+        logger.info(f"Vector store query returned {len(query_response.matches)} matches")
         
-        # Step 4: Extract message IDs from Pinecone results
+        # Step 4: Extract message IDs from vector store results
         related_message_ids = []
         for match in query_response.matches:
-            # The _id field in Pinecone should contain the MongoDB _id of chat messages
+            # The vector id is the MongoDB _id of chat messages
             pinecone_id = match.id
             related_message_ids.append(pinecone_id)
         
         logger.info(f"Found {len(related_message_ids)} related message IDs")
         logger.info(f"Message Ids {related_message_ids} related message IDs")
         
-        # Step 5: Fetch related messages from chats collection
-        system_messages = await get_related_messages(related_message_ids);
-        
-        # Step 6: Send to LLM Model to get system response
-        # Generate response using GPT-2 with context
-        system_response = await get_llm_response(user_message, system_messages)
+        # Step 5: Reuse the answer of a near-duplicate question (semantic cache)
+        cached_doc = await find_semantic_cache_hit(query_response, user_id)
+        if cached_doc:
+            system_response = cached_doc["system_message"]
+        else:
+            # Step 6: Fetch related messages from chats collection
+            scores = {match.id: match.score for match in query_response.matches}
+            system_messages = await get_related_messages(related_message_ids, user_id, scores)
+            
+            # Step 7: Send to LLM Model to get system response
+            # Generate response using GPT-2 with context
+            # Bulk messages have no client watching them stream, they are batched with the rest of their task
+            if priority == BULK:
+                system_response = await get_batched_llm_response(message_id, user_message, system_messages, BULK)
+            elif settings.LLM_STREAMING and user_id:
+                system_response = await generate_streamed_response(user_id, message_id, user_message, system_messages)
+            elif settings.LLM_MAX_BATCH_SIZE > 1:
+                system_response = await get_batched_llm_response(message_id, user_message, system_messages)
+            else:
+                system_response = await get_llm_response(user_message, system_messages)
         logger.info(f"LLM generated response for message {message_id}, Response: {system_response}")
         
-        # Step 7: Update original message with system response
-        mongo = MongoQueryApplicator(CollectionNames.CHAT.value)
-        update_result = await mongo.update_one(
-            {"_id": ObjectId(message_id)},
-            {
-                "system_message": system_response,
-                "system_message_status": ErrorAndSuccessCodes.MESSAGE_PROCESSING_SUCCESS.value,
-                "updated_at": datetime.now()
-            }
-        )
+        # Step 8: Update original message with system response
+        update_data = {
+            "system_message": system_response,
+            "system_message_status": ErrorAndSuccessCodes.MESSAGE_PROCESSING_SUCCESS.value,
+            "updated_at": datetime.now()
+        }
+        if cached_doc:
+            update_data["semantic_cache_source"] = cached_doc["_id"]
+        if llm_service.is_initialized:
+            # Tokenized once here, reused whenever this message is retrieved as context
+            update_data["context_token_ids"] = llm_service.encode_context_pair(user_message, system_response)
+        # Coalesced with the updates of other in-flight messages into one bulk_write
+        # Only the owner of the claim writes the result (a reclaimed lease has a new owner)
+        if not await write_coalescer.update_one({"_id": ObjectId(message_id), "processing_owner": owner}, update_data):
+            # The lease expired and another worker reclaimed the message, its result is the one kept
+            logger.warning(f"Lease on message {message_id} lost by {owner}, result discarded")
+            return "Message lease lost"
         
         logger.info(f"Successfully updated message {message_id} with system response")
+        await notify_message_status(user_id, message_id, ErrorAndSuccessCodes.MESSAGE_PROCESSING_SUCCESS, system_response)
         
-        # Step 8: Upsert vector to Pinecone with the complete conversation
+        # Step 9: Upsert vector to the vector store with the complete conversation
         try:
-            vector_data = [{
+            vector_data = {
                 "id": message_id,
-                "values": message_vector
-            }]
+                "values": message_vector,
+                "metadata": build_vector_metadata(message_doc)
+            }
             
-            await pinecone.upsert_vectors(vector_data)
-            logger.info(f"Successfully upserted vector to Pinecone for message {message_id}")
+            # Coalesced with the vectors of other in-flight messages into one upsert
+            await write_coalescer.upsert_vector(vector_data)
+            logger.info(f"Successfully upserted vector to the vector store for message {message_id}")
             
-        except Exception as pinecone_error:
-            logger.error(f"Error upserting vector to Pinecone for message {message_id}: {str(pinecone_error)}")
-            # Don't fail the entire process if Pinecone upsert fails
+        except Exception as vector_store_error:
+            logger.error(f"Error upserting vector to the vector store for message {message_id}: {str(vector_store_error)}")
+            # Don't fail the entire process if the vector store upsert fails
         
         return "Message processed successfully"
+    except MessageRetryError:
+        raise
     except Exception as e:
         logger.error(f"Error processing message {message_id}: {str(e)}")
         
         # Update message status to failed
         try:
+            error_response = "Sorry, I encountered an error processing your message. Please try again."
             mongo = MongoQueryApplicator(CollectionNames.CHAT.value)
-            await mongo.update_one(
-                {"_id": ObjectId(message_id)},
+            updated = await mongo.update_one(
+                {"_id": ObjectId(message_id), "processing_owner": owner},
                 {
-                    "system_message": "Sorry, I encountered an error processing your message. Please try again.",
+                    "system_message": error_response,
                     "system_message_status": ErrorAndSuccessCodes.PROCESSING_ERROR.value,
                     "updated_at": datetime.now()
                 }
             )
+            # Not claimed or lease lost: the status belongs to another attempt
+            if updated:
+                await notify_message_status(user_id, message_id, ErrorAndSuccessCodes.PROCESSING_ERROR, error_response)
         except Exception as update_error:
             logger.error(f"Failed to update error status for message {message_id}: {str(update_error)}")
         
-        return "Error processing message"
\ No newline at end of file
+        return "Error processing message"
+
+
+async def process_messages_inside_task_queue(message_ids: List[str]) -> List[str]:
+    """
+    Run the pipelines of a bulk chunk concurrently on the worker event loop,
+    so their embeddings and generations can share batches.
+    Each pipeline records its own status, one failing does not affect the others.
+    Raises:
+        MessageRetryError: With the messages that could not be claimed, once every pipeline has finished
+    """
+    results = await asyncio.gather(
+        *(process_message_inside_task_queue(message_id, BULK) for message_id in message_ids),
+        return_exceptions=True
+    )
+    retries = [result for result in results if isinstance(result, MessageRetryError)]
+    if retries:
+        # Deliver again once the last lease has expired (backoff if no lease is involved)
+        countdowns = [error.countdown for error in retries if error.countdown is not None]
+        raise MessageRetryError(
+            [message_id for error in retries for message_id in error.message_ids],
+            retries[0],
+            max(countdowns) if countdowns else None
+        )
+    return [str(result) for result in results]
@@ -1,24 +1,112 @@
-from dotenv import load_dotenv, get_key
+from dotenv import load_dotenv, dotenv_values
 from pydantic import BaseModel
+from typing import Optional
+import os
+import socket
 
 # Load environment variables from .env file
 load_dotenv()
+# Read once, looking every key up in the file logs a warning per missing key
+ENV_FILE_VALUES = dotenv_values(".env")
+
+
+def get_setting(key: str) -> Optional[str]:
+    """
+    Value of a setting: the process environment first (e.g. docker-compose `environment`), then the .env file.
+    """
+    return os.getenv(key) or ENV_FILE_VALUES.get(key)
+
 
 class Settings(BaseModel):
     """Application settings."""
     APP_NAME: str = "Neuro Chat is online"
     APP_VERSION: str = "0.1.0"
-    MONGO_URI: str = get_key(".env", "MONGO_URI")
-    MONGO_DB:str = get_key(".env", "MONGO_DB")
+    MONGO_URI: str = get_setting("MONGO_URI")
+    MONGO_DB:str = get_setting("MONGO_DB")
     MESSAGES_PER_PAGE: int = 10
+    ENSURE_INDEXES_ON_STARTUP: bool = (get_setting("ENSURE_INDEXES_ON_STARTUP") or "true").lower() == "true"
+    BULK_MAX_MESSAGES: int = int(get_setting("BULK_MAX_MESSAGES") or 1000)  # Max items of one sendMessages request
+    BULK_MESSAGES_PER_TASK: int = int(get_setting("BULK_MESSAGES_PER_TASK") or 16)  # Messages per broker task for sendMessages
+
+    # User existence cache (API process)
+    USER_CACHE_SIZE: int = int(get_setting("USER_CACHE_SIZE") or 10000)
+    USER_CACHE_TTL_SECONDS: float = float(get_setting("USER_CACHE_TTL_SECONDS") or 300)
+    USER_CACHE_NEGATIVE_TTL_SECONDS: float = float(get_setting("USER_CACHE_NEGATIVE_TTL_SECONDS") or 30)  # Unknown users
 
     # Celery
-    BROKER_URL : str = get_key(".env", "BROKER_URL")
-    BACKEND_URL : str = get_key(".env", "BACKEND_URL") 
+    BROKER_URL : str = get_setting("BROKER_URL")
+    BACKEND_URL : str = get_setting("BACKEND_URL") 
 
     #PINECONE
-    PINECONE_API_KEY: str = get_key(".env", "PINECONE_API_KEY")
-    PINECONE_INDEX_NAME: str = get_key(".env", "PINECONE_INDEX_NAME")
+    PINECONE_API_KEY: str = get_setting("PINECONE_API_KEY")
+    PINECONE_INDEX_NAME: str = get_setting("PINECONE_INDEX_NAME")
+
+    # Vector Store
+    VECTOR_STORE_BACKEND: str = get_setting("VECTOR_STORE_BACKEND") or "pinecone"  # pinecone | local
+    LOCAL_VECTOR_STORE_DIR: str = get_setting("LOCAL_VECTOR_STORE_DIR") or "data/vector_store"
+    VECTOR_SEARCH_SCOPE: str = get_setting("VECTOR_SEARCH_SCOPE") or "user"  # user | global
+    VECTOR_RECENCY_WINDOW_DAYS: float = float(get_setting("VECTOR_RECENCY_WINDOW_DAYS") or 0)  # 0 searches the whole history
+    LOCAL_VECTOR_STORE_ANN_THRESHOLD: int = int(get_setting("LOCAL_VECTOR_STORE_ANN_THRESHOLD") or 50000)  # Exact search below, HNSW above
+
+    # Pub/Sub (push delivery of message status to clients)
+    PUBSUB_BACKEND: str = get_setting("PUBSUB_BACKEND") or "redis"  # redis | memory
+    PUBSUB_URL: str = get_setting("PUBSUB_URL") or get_setting("BROKER_URL")
+    PUBSUB_HEARTBEAT_SECONDS: int = int(get_setting("PUBSUB_HEARTBEAT_SECONDS") or 15)
+
+    # Admission control (sendMessage / sendMessages), a rate of 0 disables its bucket
+    RATE_LIMIT_BACKEND: str = get_setting("RATE_LIMIT_BACKEND") or "redis"  # redis | memory
+    RATE_LIMIT_URL: str = get_setting("RATE_LIMIT_URL") or get_setting("BROKER_URL")
+    RATE_LIMIT_USER_PER_SECOND: float = float(get_setting("RATE_LIMIT_USER_PER_SECOND") or 0.5)
+    RATE_LIMIT_USER_BURST: float = float(get_setting("RATE_LIMIT_USER_BURST") or 5)
+    RATE_LIMIT_GLOBAL_PER_SECOND: float = float(get_setting("RATE_LIMIT_GLOBAL_PER_SECOND") or 20)
+    RATE_LIMIT_GLOBAL_BURST: float = float(get_setting("RATE_LIMIT_GLOBAL_BURST") or 100)
+    ADMISSION_LATENCY_TARGET_SECONDS: float = float(get_setting("ADMISSION_LATENCY_TARGET_SECONDS") or 0)  # Interactive backlog limit, 0 disables it
+    ADMISSION_SECONDS_PER_MESSAGE: float = float(get_setting("ADMISSION_SECONDS_PER_MESSAGE") or 1)  # Measured worker time per message
+    # sendMessages has its own buckets, a user's share of one request is charged at once so the bursts default to BULK_MAX_MESSAGES
+    RATE_LIMIT_BULK_USER_PER_SECOND: float = float(get_setting("RATE_LIMIT_BULK_USER_PER_SECOND") or 5)
+    RATE_LIMIT_BULK_USER_BURST: float = float(get_setting("RATE_LIMIT_BULK_USER_BURST") or get_setting("BULK_MAX_MESSAGES") or 1000)
+    RATE_LIMIT_BULK_GLOBAL_PER_SECOND: float = float(get_setting("RATE_LIMIT_BULK_GLOBAL_PER_SECOND") or 50)
+    RATE_LIMIT_BULK_GLOBAL_BURST: float = float(get_setting("RATE_LIMIT_BULK_GLOBAL_BURST") or get_setting("BULK_MAX_MESSAGES") or 1000)
+
+    # Worker
+    WORKER_TASK_CONCURRENCY: int = int(get_setting("WORKER_TASK_CONCURRENCY") or 1)  # Messages in flight per worker process
+    BLOCKING_IO_THREADS: int = int(get_setting("BLOCKING_IO_THREADS") or 8)  # Threads for blocking clients (Pinecone)
+    INFERENCE_THREADS: int = int(get_setting("INFERENCE_THREADS") or 1)  # Threads running model forward passes
+    WORKER_WARMUP: bool = (get_setting("WORKER_WARMUP") or "true").lower() == "true"  # Load and run the models before taking messages
+    WORKER_READY_FILE: str = get_setting("WORKER_READY_FILE") or "/tmp/neuro_chat_worker.ready"  # Written once a worker process is warm
+    MESSAGE_LEASE_SECONDS: float = float(get_setting("MESSAGE_LEASE_SECONDS") or 300)  # A claimed message is reclaimable after this
+    MESSAGE_MAX_RETRIES: int = int(get_setting("MESSAGE_MAX_RETRIES") or 10)  # Redeliveries of a message that could not be claimed (Mongo errors)
+    MESSAGE_RETRY_MAX_DELAY_SECONDS: float = float(get_setting("MESSAGE_RETRY_MAX_DELAY_SECONDS") or 60)  # Backoff cap between redeliveries
+    WRITE_COALESCING_MAX_BATCH_SIZE: int = int(get_setting("WRITE_COALESCING_MAX_BATCH_SIZE") or 100)  # Result writes per bulk_write / upsert (Pinecone takes up to 100 vectors)
+    WRITE_COALESCING_MAX_WAIT_MS: float = float(get_setting("WRITE_COALESCING_MAX_WAIT_MS") or 20)
+    QUEUE_SHARDS: int = int(get_setting("QUEUE_SHARDS") or 4)  # Queues per priority class, users are spread over them (see task_queues)
+    INTERACTIVE_CONCURRENCY: int = int(get_setting("INTERACTIVE_CONCURRENCY") or get_setting("WORKER_TASK_CONCURRENCY") or 1)  # Async consumer
+    BULK_CONCURRENCY: int = int(get_setting("BULK_CONCURRENCY") or 1)  # Async consumer, bulk tasks in flight (each runs BULK_MESSAGES_PER_TASK messages)
+    ASYNC_CONSUMER_ID: str = get_setting("ASYNC_CONSUMER_ID") or socket.gethostname()  # Must be stable across restarts
+
+    # Embeddings
+    EMBEDDINGS_MAX_BATCH_SIZE: int = int(get_setting("EMBEDDINGS_MAX_BATCH_SIZE") or 32)
+    EMBEDDINGS_BATCH_LINGER_MS: float = float(get_setting("EMBEDDINGS_BATCH_LINGER_MS") or 5)
+    EMBEDDINGS_CACHE_SIZE: int = int(get_setting("EMBEDDINGS_CACHE_SIZE") or 10000)  # In-process LRU entries
+    EMBEDDINGS_CACHE_DIR: Optional[str] = get_setting("EMBEDDINGS_CACHE_DIR")  # Disk tier, disabled when not set
+    EMBEDDINGS_CACHE_DISK_CAPACITY: int = int(get_setting("EMBEDDINGS_CACHE_DISK_CAPACITY") or 100000)
+    EMBEDDINGS_BACKEND: str = get_setting("EMBEDDINGS_BACKEND") or "sentence_transformers"  # sentence_transformers | int8 | onnx
+    EMBEDDINGS_ONNX_DIR: str = get_setting("EMBEDDINGS_ONNX_DIR") or "data/onnx/bge-small"  # Exported once, reused on next starts
+
+    # Semantic response cache (reuse the answer of a near-duplicate question instead of running GPT-2)
+    SEMANTIC_CACHE_ENABLED: bool = (get_setting("SEMANTIC_CACHE_ENABLED") or "false").lower() == "true"
+    SEMANTIC_CACHE_THRESHOLD: float = float(get_setting("SEMANTIC_CACHE_THRESHOLD") or 0.95)  # Min cosine score
+    SEMANTIC_CACHE_SCOPE: str = get_setting("SEMANTIC_CACHE_SCOPE") or "user"  # user | global
+
+    # LLM
+    LLM_STREAMING: bool = (get_setting("LLM_STREAMING") or "true").lower() == "true"  # Push partial responses token by token
+    LLM_STREAM_TIMEOUT_SECONDS: float = float(get_setting("LLM_STREAM_TIMEOUT_SECONDS") or 120)  # Max wait for the next chunk once generation started
+    LLM_MAX_BATCH_SIZE: int = int(get_setting("LLM_MAX_BATCH_SIZE") or 1)  # > 1 enables batched generation (non streaming)
+    LLM_MAX_BATCH_WAIT_MS: float = float(get_setting("LLM_MAX_BATCH_WAIT_MS") or 20)
+    LLM_BULK_MAX_BATCH_SIZE: int = int(get_setting("LLM_BULK_MAX_BATCH_SIZE") or get_setting("BULK_MESSAGES_PER_TASK") or 16)  # Bulk messages are always batched, never streamed
+    LLM_PREFIX_CACHE: bool = (get_setting("LLM_PREFIX_CACHE") or "true").lower() == "true"  # Reuse the KV cache of the prompt preamble
+    LLM_BACKEND: str = get_setting("LLM_BACKEND") or "eager"  # eager | int8 | compile | onnx
+    LLM_ONNX_DIR: str = get_setting("LLM_ONNX_DIR") or "data/onnx/gpt2"  # Exported once, reused on next starts
 
     class Config:
         env_file = ".env"
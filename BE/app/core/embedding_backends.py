@@ -0,0 +1,122 @@
+'''
+    BGE-small embedding backends, selected with EMBEDDINGS_BACKEND:
+        sentence_transformers: langchain HuggingFaceBgeEmbeddings, float32 (reference)
+        int8: transformers encoder with dynamic int8 quantization of its linear layers
+        onnx: ONNX Runtime session through optimum (optional dependency, exported once to EMBEDDINGS_ONNX_DIR)
+
+    Every backend has the interface the embedding batcher and warm-up use (embed_documents, embed_query,
+    query_instruction) and returns L2 normalized 384-d vectors, CLS pooled like the sentence-transformers
+    configuration of BGE. Vectors of int8 and onnx stay within EMBEDDINGS_PARITY_MIN_COSINE of the reference,
+    so they are interchangeable with the ones already in the vector store and the embedding cache.
+    Check: python -m benchmarks.embedding_backends
+'''
+from app.core.config import settings
+from app.utils.logger import get_logger
+
+from typing import Any, Dict, List, Tuple
+import os
+import torch
+
+logger = get_logger("embedding_backends")
+
+EMBEDDING_BACKENDS = ("sentence_transformers", "int8", "onnx")
+
+# Lowest cosine similarity to the sentence_transformers vector of the same text, measured on
+# benchmarks.embedding_backends texts (onnx: float32, practically 1.0, int8: quantized weights)
+EMBEDDINGS_PARITY_MIN_COSINE = 0.99
+
+
+class BgeEncoder:
+    """
+    BGE encoder on a bare transformers (or optimum) model, same vectors contract as
+    HuggingFaceBgeEmbeddings with normalize_embeddings=True: CLS token pooling, L2 normalized,
+    query instruction prepended by embed_query only.
+    """
+
+    def __init__(self, model: Any, tokenizer: Any, query_instruction: str, batch_size: int = 32, max_length: int = 512):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.query_instruction = query_instruction
+        self.batch_size = batch_size
+        self.max_length = max_length
+
+    def _encode(self, texts: List[str]) -> torch.Tensor:
+        inputs = self.tokenizer(texts, padding=True, truncation=True, max_length=self.max_length, return_tensors="pt")
+        with torch.no_grad():
+            hidden = self.model(**inputs).last_hidden_state
+        return torch.nn.functional.normalize(hidden[:, 0], p=2, dim=1)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors = []
+        for start in range(0, len(texts), self.batch_size):
+            vectors.extend(self._encode(texts[start:start + self.batch_size]).tolist())
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([self.query_instruction + text])[0]
+
+
+def default_query_instruction() -> str:
+    from langchain_community.embeddings.huggingface import DEFAULT_QUERY_BGE_INSTRUCTION_EN
+    return DEFAULT_QUERY_BGE_INSTRUCTION_EN
+
+
+def load_sentence_transformers(model_name: str, model_kwargs: Dict[str, Any], encode_kwargs: Dict[str, Any]) -> Any:
+    from langchain_community.embeddings import HuggingFaceBgeEmbeddings
+    return HuggingFaceBgeEmbeddings(model_name=model_name, model_kwargs=model_kwargs, encode_kwargs=encode_kwargs)
+
+
+def load_int8(model_name: str, model_kwargs: Dict[str, Any], encode_kwargs: Dict[str, Any]) -> Any:
+    if model_kwargs.get("device", "cpu") != "cpu":
+        raise RuntimeError("Dynamic int8 quantization only runs on CPU")
+    from transformers import AutoModel, AutoTokenizer
+
+    model = AutoModel.from_pretrained(model_name)
+    model.eval()
+    # BERT projections are nn.Linear, the float weights are released once replaced
+    model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    return BgeEncoder(model, AutoTokenizer.from_pretrained(model_name), default_query_instruction())
+
+
+def load_onnx(model_name: str, model_kwargs: Dict[str, Any], encode_kwargs: Dict[str, Any]) -> Any:
+    if model_kwargs.get("device", "cpu") != "cpu":
+        raise RuntimeError("The ONNX backend is set up for the CPU execution provider only")
+    from optimum.onnxruntime import ORTModelForFeatureExtraction
+    from transformers import AutoTokenizer
+
+    export_dir = settings.EMBEDDINGS_ONNX_DIR
+    if os.path.isdir(export_dir) and os.listdir(export_dir):
+        model = ORTModelForFeatureExtraction.from_pretrained(export_dir)
+    else:
+        logger.info(f"Exporting {model_name} to ONNX in {export_dir}")
+        model = ORTModelForFeatureExtraction.from_pretrained(model_name, export=True)
+        model.save_pretrained(export_dir)
+    return BgeEncoder(model, AutoTokenizer.from_pretrained(model_name), default_query_instruction())
+
+
+LOADERS = {
+    "sentence_transformers": load_sentence_transformers,
+    "int8": load_int8,
+    "onnx": load_onnx
+}
+
+
+def load_embedding_model(backend: str, model_name: str, model_kwargs: Dict[str, Any],
+                         encode_kwargs: Dict[str, Any]) -> Tuple[Any, str]:
+    """
+    Load the embedding model with the requested backend. Falls back to sentence_transformers when the
+    backend is unknown, its dependencies are missing or it does not support the device.
+    Returns:
+        (model, name of the backend actually loaded)
+    """
+    if backend not in LOADERS:
+        logger.warning(f"Unknown embeddings backend '{backend}', using sentence_transformers "
+                       f"(one of {', '.join(EMBEDDING_BACKENDS)})")
+        backend = "sentence_transformers"
+    try:
+        return LOADERS[backend](model_name, model_kwargs, encode_kwargs), backend
+    except (ImportError, RuntimeError) as e:
+        if backend == "sentence_transformers":
+            raise
+        logger.warning(f"Embeddings backend '{backend}' unavailable ({str(e)}), using sentence_transformers")
+        return load_sentence_transformers(model_name, model_kwargs, encode_kwargs), "sentence_transformers"
@@ -0,0 +1,88 @@
+from app.core.config import settings
+from app.core.embeddings_config import EmbeddingsConfig, embeddings
+from app.core.embedding_cache import EmbeddingCache, embedding_cache
+from app.core.cache_metrics import CacheMetrics, embedding_cache_metrics
+from app.utils.logger import get_logger
+from app.utils.executors import run_inference
+from app.utils.micro_batcher import MicroBatcher
+
+from typing import List, Optional
+import asyncio
+
+logger = get_logger("embedding_batcher")
+
+
+class EmbeddingBatcher:
+    """
+    Merges concurrent embed requests of in-flight tasks into one embed_documents call.
+    BGE encodes many texts in one forward pass far cheaper than one at a time.
+    """
+
+    def __init__(self, embeddings_config: EmbeddingsConfig, max_batch_size: int, linger_ms: float,
+                 cache: Optional[EmbeddingCache] = None, metrics: Optional[CacheMetrics] = None):
+        self.embeddings_config = embeddings_config
+        self.cache = cache
+        self.metrics = metrics
+        self.batcher = MicroBatcher(
+            self._embed_batch,
+            max_batch_size=max_batch_size,
+            max_wait_ms=linger_ms,
+            name="embedding_batcher"
+        )
+
+    async def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        if self.embeddings_config.is_initialized():
+            model = self.embeddings_config.hf
+        else:
+            model = await self.embeddings_config.initialize_embeddings()
+
+        # embed_query prepends the BGE query instruction, embed_documents does not.
+        # Prepend it here so vectors stay identical to embed_query ones.
+        instruction = getattr(model, "query_instruction", "")
+        queries = [instruction + text for text in texts]
+
+        logger.info(f"Embedding batch of {len(texts)} messages")
+        return await run_inference(model.embed_documents, queries)
+
+    def embed_async(self, text: str) -> asyncio.Future:
+        """
+        Queue a text for the next encoder batch.
+        Returns:
+            asyncio.Future: Resolved with the normalized embedding of the text
+        """
+        return self.batcher.enqueue(text)
+
+    async def embed(self, text: str) -> List[float]:
+        """
+        Embed a text. Cached texts skip the encoder, others share
+        the encoder call with concurrent requests.
+        """
+        if self.cache is not None:
+            disk_hits = self.cache.disk_hits
+            vector = self.cache.get(text)
+            if self.metrics is not None:
+                await self.metrics.record(vector is not None, self.cache.disk_hits != disk_hits)
+            if vector is not None:
+                self._log_cache_stats()
+                return vector
+
+        vector = await self.embed_async(text)
+
+        if self.cache is not None:
+            self.cache.put(text, vector)
+            self._log_cache_stats()
+        return vector
+
+    def _log_cache_stats(self) -> None:
+        stats = self.cache.stats()
+        if (stats["hits"] + stats["misses"]) % 100 == 0:
+            logger.info(f"Embedding cache stats: {stats}")
+
+
+embedding_batcher = EmbeddingBatcher(
+    embeddings,
+    max_batch_size=settings.EMBEDDINGS_MAX_BATCH_SIZE,
+    linger_ms=settings.EMBEDDINGS_BATCH_LINGER_MS,
+    cache=embedding_cache,
+    metrics=embedding_cache_metrics
+)
@@ -0,0 +1,161 @@
+from app.core.config import settings
+from app.core.embeddings_config import embeddings
+from app.utils.logger import get_logger
+
+from collections import OrderedDict
+from typing import Dict, List, Optional
+import fcntl
+import hashlib
+import os
+import numpy as np
+
+logger = get_logger("embedding_cache")
+
+
+def normalize_text(text: str) -> str:
+    """
+    Normalize a message before hashing.
+    BGE-small lowercases its input and ignores extra whitespace,
+    so texts differing only in those map to the same vector.
+    """
+    return " ".join(text.lower().split())
+
+
+def cache_key(text: str, model_name: str) -> str:
+    return hashlib.sha256(f"{model_name}\0{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+
+class DiskEmbeddingStore:
+    """
+    On-disk embedding tier shared by the worker processes and kept across restarts.
+    Vectors live in a memory-mapped float32 matrix (vectors.f32), keys are appended to
+    keys.idx, the row of a key being its line number. A vector is written before its key,
+    so readers never see a key without its vector.
+    """
+
+    def __init__(self, directory: str, dimension: int, capacity: int):
+        os.makedirs(directory, exist_ok=True)
+        self.dimension = dimension
+        self.capacity = capacity
+        self.keys_path = os.path.join(directory, "keys.idx")
+        vectors_path = os.path.join(directory, "vectors.f32")
+        mode = "r+" if os.path.exists(vectors_path) else "w+"
+        self.vectors = np.memmap(vectors_path, dtype=np.float32, mode=mode, shape=(capacity, dimension))
+        self.index: Dict[str, int] = {}
+        self.keys_offset = 0
+        open(self.keys_path, "a").close()
+        self._refresh()
+        logger.info(f"Disk embedding cache opened at {directory} with {len(self.index)} vectors")
+
+    def _refresh(self) -> None:
+        """
+        Load keys appended since the last read (possibly by other processes).
+        """
+        with open(self.keys_path, "r") as keys_file:
+            keys_file.seek(self.keys_offset)
+            for line in keys_file:
+                if not line.endswith("\n"):
+                    break
+                self.index[line.rstrip("\n")] = len(self.index)
+                self.keys_offset += len(line)
+
+    def get(self, key: str) -> Optional[List[float]]:
+        row = self.index.get(key)
+        if row is None and os.path.getsize(self.keys_path) != self.keys_offset:
+            self._refresh()
+            row = self.index.get(key)
+        if row is None:
+            return None
+        return self.vectors[row].tolist()
+
+    def put(self, key: str, vector: List[float]) -> None:
+        with open(self.keys_path, "a") as keys_file:
+            fcntl.flock(keys_file, fcntl.LOCK_EX)
+            try:
+                self._refresh()
+                if key in self.index:
+                    return
+                row = len(self.index)
+                if row >= self.capacity:
+                    return
+                self.vectors[row] = np.asarray(vector, dtype=np.float32)
+                keys_file.write(key + "\n")
+                keys_file.flush()
+                self.index[key] = row
+                self.keys_offset += len(key) + 1
+            finally:
+                fcntl.flock(keys_file, fcntl.LOCK_UN)
+
+
+class EmbeddingCache:
+    """
+    Content-addressed embedding cache: in-process LRU tier plus optional disk tier.
+    Keyed by hash of (model name, normalized text), repeated messages skip the encoder.
+    """
+
+    def __init__(self, model_name: str, dimension: int, max_entries: int,
+                 disk_directory: Optional[str] = None, disk_capacity: int = 100000):
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.memory: "OrderedDict[str, List[float]]" = OrderedDict()
+        self.disk: Optional[DiskEmbeddingStore] = None
+        if disk_directory:
+            try:
+                self.disk = DiskEmbeddingStore(disk_directory, dimension, disk_capacity)
+            except Exception as e:
+                logger.error(f"Disk embedding cache disabled, failed to open {disk_directory}: {str(e)}")
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _remember(self, key: str, vector: List[float]) -> None:
+        self.memory[key] = vector
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_entries:
+            self.memory.popitem(last=False)
+
+    def get(self, text: str) -> Optional[List[float]]:
+        key = cache_key(text, self.model_name)
+        vector = self.memory.get(key)
+        if vector is not None:
+            self.memory.move_to_end(key)
+            self.hits += 1
+            return vector
+        if self.disk is not None:
+            vector = self.disk.get(key)
+            if vector is not None:
+                self._remember(key, vector)
+                self.hits += 1
+                self.disk_hits += 1
+                return vector
+        self.misses += 1
+        return None
+
+    def put(self, text: str, vector: List[float]) -> None:
+        key = cache_key(text, self.model_name)
+        self._remember(key, vector)
+        if self.disk is not None:
+            try:
+                self.disk.put(key, vector)
+            except Exception as e:
+                logger.error(f"Error writing embedding to disk cache: {str(e)}")
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "memory_entries": len(self.memory),
+            "disk_entries": len(self.disk.index) if self.disk is not None else 0
+        }
+
+
+embedding_cache = EmbeddingCache(
+    embeddings.model_name,
+    dimension=embeddings.dimension,
+    max_entries=settings.EMBEDDINGS_CACHE_SIZE,
+    disk_directory=settings.EMBEDDINGS_CACHE_DIR,
+    disk_capacity=settings.EMBEDDINGS_CACHE_DISK_CAPACITY
+)
@@ -1,11 +1,15 @@
-from langchain_community.embeddings import HuggingFaceBgeEmbeddings
+from app.core.config import settings
+from app.core.embedding_backends import load_embedding_model
 
 class EmbeddingsConfig:
     def __init__(self):
         self.model_name = "BAAI/bge-small-en-v1.5"
+        self.dimension = 384
         self.model_kwargs = {"device": "cpu"}
         self.encode_kwargs = {"normalize_embeddings": True}
         self.hf = None
+        # Backend actually loaded (EMBEDDINGS_BACKEND, or sentence_transformers as fallback)
+        self.backend = None
         self.initialized = False
 
     async def initialize_embeddings(self):
@@ -14,8 +18,9 @@ class EmbeddingsConfig:
             print(f"Embeddings config already initialized with model '{self.model_name}'")
             return self.hf
             
-        print(f"Initializing embeddings with model '{self.model_name}'")
-        self.hf = HuggingFaceBgeEmbeddings(
+        print(f"Initializing embeddings with model '{self.model_name}' (backend: {settings.EMBEDDINGS_BACKEND})")
+        self.hf, self.backend = load_embedding_model(
+            settings.EMBEDDINGS_BACKEND,
             model_name=self.model_name, 
             model_kwargs=self.model_kwargs, 
             encode_kwargs=self.encode_kwargs
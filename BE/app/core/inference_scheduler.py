@@ -0,0 +1,92 @@
+from app.core.config import settings
+from app.core.llm import LLMService, llm_service
+from app.core.task_queues import BULK, INTERACTIVE
+from app.utils.logger import get_logger
+from app.utils.executors import run_inference
+from app.utils.micro_batcher import MicroBatcher
+
+from typing import Any, Dict, List
+
+logger = get_logger("inference_scheduler")
+
+
+class InferenceScheduler:
+    """
+    Dynamic batching of GPT-2 generation inside a worker process.
+    Messages in flight on the worker event loop are collected for up to
+    LLM_MAX_BATCH_WAIT_MS (or until LLM_MAX_BATCH_SIZE are pending),
+    left-padded and run through one batched generate.
+    Each response is routed back to the pipeline of its message_id.
+    """
+
+    def __init__(self, llm: LLMService, max_batch_size: int, max_wait_ms: float, name: str = "inference_scheduler"):
+        self.llm = llm
+        self.batcher = MicroBatcher(
+            self._generate_batch,
+            max_batch_size=max_batch_size,
+            max_wait_ms=max_wait_ms,
+            name=name
+        )
+
+    async def _generate_batch(self, requests: List[Dict[str, Any]]) -> List[str]:
+        if not self.llm.is_initialized:
+            await self.llm.initialize_model()
+
+        message_ids = [request["message_id"] for request in requests]
+        logger.info(f"Generating batch of {len(requests)} messages: {message_ids}")
+
+        # generate is blocking, keep the event loop free to collect the next batch
+        return await run_inference(self.llm.generate_batch, requests)
+
+    async def generate(self, message_id: str, user_message: str, system_messages: List[Dict[str, str]] = None) -> str:
+        """
+        Queue a message for the next batch and wait for its response.
+        Args:
+            message_id: The _id of the message, used for logging
+            user_message: Current user message
+            system_messages: Previous conversation context
+        Returns:
+            str: Generated response
+        """
+        return await self.batcher.submit({
+            "message_id": message_id,
+            "user_message": user_message,
+            "system_messages": system_messages or []
+        })
+
+
+inference_scheduler = InferenceScheduler(
+    llm_service,
+    max_batch_size=settings.LLM_MAX_BATCH_SIZE,
+    max_wait_ms=settings.LLM_MAX_BATCH_WAIT_MS
+)
+
+# Bulk messages are never streamed, the messages of a bulk task always share generate calls
+bulk_inference_scheduler = InferenceScheduler(
+    llm_service,
+    max_batch_size=settings.LLM_BULK_MAX_BATCH_SIZE,
+    max_wait_ms=settings.LLM_MAX_BATCH_WAIT_MS,
+    name="bulk_inference_scheduler"
+)
+
+
+async def get_batched_llm_response(message_id: str, user_message: str, system_messages: List[Dict[str, str]] = None,
+                                   priority: str = INTERACTIVE) -> str:
+    """
+    Convenience function to get LLM response through the batching scheduler.
+
+    Args:
+        message_id: The _id of the message
+        user_message: Current user message
+        system_messages: Previous conversation context
+        priority: Priority class of the message, bulk messages are batched with each other
+
+    Returns:
+        str: Generated response
+    """
+    try:
+        scheduler = bulk_inference_scheduler if priority == BULK else inference_scheduler
+        return await scheduler.generate(message_id, user_message, system_messages)
+    except Exception as e:
+        logger.error(f"Error getting batched LLM response for message {message_id}: {str(e)}")
+        return "I apologize, but I encountered an error while processing your message. Please try again."
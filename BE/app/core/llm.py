@@ -1,12 +1,39 @@
-from transformers import GPT2LMHeadModel, GPT2Tokenizer
-from typing import List, Dict, Any, Optional
+from transformers import GPT2TokenizerFast, TextIteratorStreamer, StoppingCriteria, StoppingCriteriaList
+from typing import List, Dict, Any, Optional, AsyncIterator, Awaitable, Callable, Tuple
 from app.utils.logger import get_logger
+from app.core.config import settings
+from app.core.llm_backends import PREFIX_CACHE_BACKENDS, load_model
+from app.utils.executors import inference_executor, run_inference, stream_executor
+import copy
 import torch
 import asyncio
+import threading
 from functools import lru_cache
 
 logger = get_logger("llm_service")
 
+# Static instruction preamble, identical for every prompt (its KV cache is computed once, see _build_prefix_cache)
+PROMPT_PREAMBLE = '''You are a helpful chat assistant. 
+        You are given a conversation history and a current user question. 
+        You need to generate a response to the user question based on the conversation history. 
+        The response should be formal and in the same language as the user question. 
+        Avoid any other text or information in the response.'''
+
+# Patterns that indicate the model started a new turn, response ends there
+STOP_PATTERNS = ["\n\nUser:", "\nUser:", "\n\nCurrent user", "\nCurrent user"]
+
+
+class _StopOnEvent(StoppingCriteria):
+    """
+    Stops generation once the consumer of a stream has seen enough.
+    """
+
+    def __init__(self, stop_event: threading.Event):
+        self.stop_event = stop_event
+
+    def __call__(self, input_ids, scores, **kwargs) -> bool:
+        return self.stop_event.is_set()
+
 
 class LLMService:
     """
@@ -18,8 +45,17 @@ class LLMService:
         self.model = None
         self.tokenizer = None
         self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-        self.max_length = 512
+        # Prompt plus new tokens, GPT-2 has 1024 positions (set from the model config on load)
+        self.context_window = 1024
         self.is_initialized = False
+        # Inference backend actually loaded (LLM_BACKEND, or eager as fallback)
+        self.backend: Optional[str] = None
+        self.preamble_ids: List[int] = []
+        # Token ids of the fixed prompt pieces (labels, conversation numbers), tokenized once
+        self.piece_ids: Dict[str, List[int]] = {}
+        # KV cache of PROMPT_PREAMBLE, shared read-only by every generation
+        self.prefix_ids: Optional[torch.Tensor] = None
+        self.prefix_cache = None
     
     async def initialize_model(self):
         """
@@ -34,71 +70,94 @@ class LLMService:
             
             # Load pre-trained GPT-2 model and tokenizer
             model_name = "gpt2"
-            self.tokenizer = GPT2Tokenizer.from_pretrained(model_name)
-            self.model = GPT2LMHeadModel.from_pretrained(model_name)
+            # Rust tokenizer, same ids as the pure Python GPT2Tokenizer
+            self.tokenizer = GPT2TokenizerFast.from_pretrained(model_name)
+            # Moved to the device and in eval mode, whichever backend is used
+            self.model, self.backend = load_model(settings.LLM_BACKEND, model_name, self.device)
             
             # Add pad token if not present
             if self.tokenizer.pad_token is None:
                 self.tokenizer.pad_token = self.tokenizer.eos_token
+            # Decoder-only model: pad on the left so every prompt ends right before its new tokens
+            self.tokenizer.padding_side = "left"
             
-            # Move model to appropriate device
-            self.model.to(self.device)
-            self.model.eval()
+            self.context_window = self.model.config.n_positions
+            self.preamble_ids = self._encode(PROMPT_PREAMBLE)
+            if settings.LLM_PREFIX_CACHE and self.backend in PREFIX_CACHE_BACKENDS:
+                self._build_prefix_cache()
             
             self.is_initialized = True
-            logger.info(f"GPT-2 model initialized successfully on device: {self.device}")
+            logger.info(f"GPT-2 model initialized successfully on device: {self.device} (backend: {self.backend})")
             
         except Exception as e:
             logger.error(f"Error initializing GPT-2 model: {str(e)}")
             raise
     
-    def _format_context(self, system_messages: List[Dict[str, str]]) -> str:
+    def _encode(self, text: str) -> List[int]:
         """
-        Format previous conversation context into a readable string.        
-        Args:
-            system_messages: List of previous user-system message pairs
-        Returns:
-            str: Formatted context string
+        Token ids of a piece of prompt text, without special tokens.
         """
-        if not system_messages:
-            return ""
-        
-        context = "Previous conversation context:\n"
-        for i, msg_pair in enumerate(system_messages, 1):
-            user_msg = msg_pair.get("user", "")
-            system_msg = msg_pair.get("system", "")
-            
-            if user_msg and system_msg:
-                context += f"\nConversation {i}:\n"
-                context += f"User: {user_msg}\n"
-                context += f"Assistant: {system_msg}\n"
-        
-        return context + "\n"
+        return self.tokenizer.encode(text)
     
-    def _create_prompt(self, user_message: str, system_messages: List[Dict[str, str]]) -> str:
+    def _encode_piece(self, text: str) -> List[int]:
         """
-        Create a comprehensive prompt using the user message and context.
+        Token ids of a fixed piece of the prompt template, cached.
+        """
+        ids = self.piece_ids.get(text)
+        if ids is None:
+            ids = self.piece_ids[text] = self._encode(text)
+        return ids
+    
+    def encode_context_pair(self, user_message: str, system_message: str) -> List[int]:
+        """
+        Token ids of a completed message as it appears in the context of later prompts.
+        Stored with the message when it completes (context_token_ids), so it is not tokenized again
+        every time it is retrieved as context. Model must be initialized.
+        """
+        return self._encode(f"User: {user_message}\nAssistant: {system_message}\n")
+    
+    def _build_prompt_ids(self, user_message: str, system_messages: List[Dict[str, Any]], budget: int) -> List[int]:
+        """
+        Token ids of the variable part of the prompt (following PROMPT_PREAMBLE), at most `budget` tokens.
+        The question and the "Assistant response:" cue are always included (a question longer than the budget
+        is cut, never the cue). Previous conversation pairs are added by relevance score, best first,
+        as long as they fit in what is left: a pair that does not fit is skipped, never truncated.
+        Pieces are tokenized separately and counted as they are added, so text that does not fit is not encoded
+        into the prompt and nothing is thrown away afterwards.
         Args:
             user_message: Current user message
-            system_messages: Previous conversation context
-            
+            system_messages: Previous user-system message pairs, with an optional relevance "score"
+                and their stored "token_ids"
+            budget: Maximum number of tokens
         Returns:
-            str: Complete prompt for GPT-2
+            List[int]: Prompt token ids
         """
-        # Format context from previous conversations
-        context = self._format_context(system_messages)
+        history = self._encode_piece(", Previous Converstion History : ")
+        question = self._encode(f", Current user question: {user_message}")
+        cue = self._encode_piece(", Assistant response:")
+        question = question[:max(0, budget - len(history) - len(cue))]
         
-        # Sample prompt template
-        prompt = '''You are a helpful chat assistant. 
-        You are given a conversation history and a current user question. 
-        You need to generate a response to the user question based on the conversation history. 
-        The response should be formal and in the same language as the user question. 
-        Avoid any other text or information in the response.'''
+        context_header = self._encode_piece("Previous conversation context:\n")
+        context_end = self._encode_piece("\n")
+        remaining = budget - len(history) - len(question) - len(cue) - len(context_header) - len(context_end)
         
-        # Build the complete prompt
-        full_prompt = f"""{prompt}, Previous Converstion History : {context}, Current user question: {user_message}, Assistant response:"""
+        pairs = []
+        ranked = sorted(system_messages, key=lambda msg_pair: msg_pair.get("score") or 0.0, reverse=True)
+        for msg_pair in ranked:
+            user_msg = msg_pair.get("user", "")
+            system_msg = msg_pair.get("system", "")
+            if not user_msg or not system_msg:
+                continue
+            # Stored ids of the message when available (see encode_context_pair)
+            pair_ids = msg_pair.get("token_ids") or self.encode_context_pair(user_msg, system_msg)
+            pair = self._encode_piece(f"\nConversation {len(pairs) + 1}:\n") + pair_ids
+            if len(pair) > remaining:
+                continue
+            pairs.append(pair)
+            remaining -= len(pair)
         
-        return full_prompt
+        context = context_header + [token for pair in pairs for token in pair] + context_end if pairs else []
+        return history + context + question + cue
     
     async def generate_response(
         self, 
@@ -134,38 +193,26 @@ class LLMService:
             if system_messages is None:
                 system_messages = []
             
-            # Create the prompt
-            prompt = self._create_prompt(user_message, system_messages)
-            
             logger.info(f"Generating response for user message: {user_message[:50]}...")
             logger.info(f"Using {len(system_messages)} previous conversations as context")
             
-            # Tokenize the prompt
-            inputs = self.tokenizer.encode(
-                prompt, 
-                return_tensors="pt", 
-                max_length=self.max_length, 
-                truncation=True
-            ).to(self.device)
-            
-            # Generate response
-            with torch.no_grad():
-                outputs = self.model.generate(
-                    inputs,
-                    max_new_tokens=max_new_tokens,
-                    temperature=temperature,
-                    do_sample=do_sample,
-                    top_k=top_k,
-                    top_p=top_p,
-                    pad_token_id=self.tokenizer.eos_token_id,
-                    attention_mask=torch.ones(inputs.shape, device=self.device)
-                )
+            # Build the prompt within the token budget (the preamble comes from the prefix cache)
+            inputs = self._prepare_inputs([(user_message, system_messages)], max_new_tokens)
             
-            # Decode the response
-            full_response = self.tokenizer.decode(outputs[0], skip_special_tokens=True)
+            # Generate response (blocking, runs on the inference executor)
+            outputs = await run_inference(
+                self._generate,
+                **inputs,
+                max_new_tokens=max_new_tokens,
+                temperature=temperature,
+                do_sample=do_sample,
+                top_k=top_k,
+                top_p=top_p,
+                pad_token_id=self.tokenizer.eos_token_id
+            )
             
-            # Extract only the generated part (remove the prompt)
-            response = full_response[len(prompt):].strip()
+            # Decode only the generated part (the prompt is not decoded)
+            response = self.tokenizer.decode(outputs[0, inputs["input_ids"].shape[1]:], skip_special_tokens=True).strip()
             
             # Clean up the response
             response = self._clean_response(response)
@@ -178,6 +225,270 @@ class LLMService:
             logger.error(f"Error generating response: {str(e)}")
             return "I apologize, but I encountered an error while processing your message. Please try again."
     
+    def _build_prefix_cache(self) -> None:
+        """
+        Run PROMPT_PREAMBLE through the model once and keep its past_key_values,
+        so every generation only prefills the variable part of its prompt.
+        """
+        self.prefix_ids = torch.tensor([self.preamble_ids], device=self.device)
+        with torch.no_grad():
+            self.prefix_cache = self.model(self.prefix_ids, use_cache=True).past_key_values
+        logger.info(f"Prompt preamble cached ({self.prefix_ids.shape[1]} tokens)")
+    
+    def _expand_prefix_cache(self, batch_size: int):
+        """
+        Private copy of the preamble cache for one generate call (generate appends to it),
+        one row per prompt of the batch.
+        """
+        if hasattr(self.prefix_cache, "batch_repeat_interleave"):
+            cache = copy.deepcopy(self.prefix_cache)
+            if batch_size > 1:
+                cache.batch_repeat_interleave(batch_size)
+            return cache
+        # Legacy tuple format, repeat already creates new tensors
+        return tuple(
+            tuple(tensor.repeat(batch_size, 1, 1, 1) for tensor in layer)
+            for layer in self.prefix_cache
+        )
+    
+    def _prepare_inputs(self, requests: List[Tuple[str, List[Dict[str, Any]]]], max_new_tokens: int) -> Dict[str, Any]:
+        """
+        Model inputs for one or more prompts, on the model device.
+        Every prompt is built within the context window minus `max_new_tokens` (see _build_prompt_ids).
+        With the prefix cache every row is [preamble][padding][variable part]: the preamble sits at the
+        positions it has in the cache, padding is masked out and the position ids generate derives from
+        the attention mask continue right after the preamble. Without it, whole prompts are left-padded.
+        Args:
+            requests: (user_message, system_messages) pairs
+            max_new_tokens: Tokens the generation may add
+        Returns:
+            Dict with input_ids and attention_mask of shape (batch_size, sequence_length),
+            plus past_key_values holding the preamble when the prefix cache is enabled
+        """
+        budget = self.context_window - max_new_tokens - len(self.preamble_ids)
+        suffixes = [
+            self._build_prompt_ids(user_message, system_messages or [], budget)
+            for user_message, system_messages in requests
+        ]
+        width = max(len(ids) for ids in suffixes)
+        
+        if self.prefix_cache is None:
+            input_ids = [[self.tokenizer.pad_token_id] * (width - len(ids)) + self.preamble_ids + ids for ids in suffixes]
+            attention_mask = [[0] * (width - len(ids)) + [1] * (len(self.preamble_ids) + len(ids)) for ids in suffixes]
+            return {
+                "input_ids": torch.tensor(input_ids, device=self.device),
+                "attention_mask": torch.tensor(attention_mask, device=self.device)
+            }
+        
+        prefix = self.preamble_ids
+        input_ids = [prefix + [self.tokenizer.pad_token_id] * (width - len(ids)) + ids for ids in suffixes]
+        attention_mask = [[1] * len(prefix) + [0] * (width - len(ids)) + [1] * len(ids) for ids in suffixes]
+        return {
+            "input_ids": torch.tensor(input_ids, device=self.device),
+            "attention_mask": torch.tensor(attention_mask, device=self.device),
+            "past_key_values": self._expand_prefix_cache(len(requests))
+        }
+    
+    def _generate(self, *args, **kwargs) -> torch.Tensor:
+        """
+        Blocking model.generate without gradient tracking.
+        """
+        with torch.no_grad():
+            return self.model.generate(*args, **kwargs)
+    
+    def warm_up(self, max_new_tokens: int = 8) -> None:
+        """
+        Run a short generation on a typical prompt so the first real message does not pay for
+        cold weights, allocator growth and kernel selection.
+        Blocking, run it outside the event loop. Model must be initialized.
+        """
+        inputs = self._prepare_inputs([("Hello, how are you?", [{"user": "Hi", "system": "Hello! How can I help you?"}])], max_new_tokens)
+        self._generate(
+            **inputs,
+            max_new_tokens=max_new_tokens,
+            do_sample=True,
+            top_k=50,
+            top_p=0.95,
+            pad_token_id=self.tokenizer.eos_token_id
+        )
+    
+    def generate_batch(
+        self, 
+        requests: List[Dict[str, Any]],
+        max_new_tokens: int = 100,
+        temperature: float = 0.8,
+        do_sample: bool = True,
+        top_k: int = 40,
+        top_p: float = 0.9
+    ) -> List[str]:
+        """
+        Generate responses for several messages with a single batched generate call.
+        Blocking, run it outside the event loop. Model must be initialized.
+        
+        Args:
+            requests: Dicts with user_message and system_messages
+            max_new_tokens: Maximum number of new tokens to generate
+            temperature: Sampling temperature
+            do_sample: Whether to use sampling
+            top_k: Top-k sampling parameter
+            top_p: Top-p sampling parameter
+            
+        Returns:
+            List[str]: One generated response per request, in request order
+        """
+        inputs = self._prepare_inputs([
+            (request["user_message"], request.get("system_messages") or [])
+            for request in requests
+        ], max_new_tokens)
+        
+        outputs = self._generate(
+            **inputs,
+            max_new_tokens=max_new_tokens,
+            temperature=temperature,
+            do_sample=do_sample,
+            top_k=top_k,
+            top_p=top_p,
+            pad_token_id=self.tokenizer.eos_token_id
+        )
+        
+        # Padding is never on the right: new tokens start at the same offset for every row
+        new_tokens = outputs[:, inputs["input_ids"].shape[1]:]
+        responses = self.tokenizer.batch_decode(new_tokens, skip_special_tokens=True)
+        return [self._clean_response(response) for response in responses]
+    
+    async def stream_tokens(
+        self, 
+        user_message: str, 
+        system_messages: List[Dict[str, str]] = None,
+        max_new_tokens: int = 150,
+        temperature: float = 0.7,
+        do_sample: bool = True,
+        top_k: int = 50,
+        top_p: float = 0.95
+    ) -> AsyncIterator[str]:
+        """
+        Generate a response using GPT-2 and yield the text incrementally as it is decoded.
+        Generation runs on the inference executor feeding a TextIteratorStreamer,
+        the prompt is not part of the yielded text. The streamer timeout (LLM_STREAM_TIMEOUT_SECONDS between
+        two chunks) only starts once generation has begun, time queued behind other generations does not count.
+        Generation stops early once a stop pattern has been produced.
+        
+        Args:
+            user_message: Current user message
+            system_messages: Previous conversation context
+            max_new_tokens: Maximum number of new tokens to generate
+            temperature: Sampling temperature
+            do_sample: Whether to use sampling
+            top_k: Top-k sampling parameter
+            top_p: Top-p sampling parameter
+            
+        Yields:
+            str: Newly decoded text
+        Raises:
+            queue.Empty: No new chunk within the timeout
+        """
+        if not self.is_initialized:
+            await self.initialize_model()
+        
+        inputs = self._prepare_inputs([(user_message, system_messages or [])], max_new_tokens)
+        
+        logger.info(f"Streaming response for user message: {user_message[:50]}...")
+        
+        streamer = TextIteratorStreamer(self.tokenizer, skip_prompt=True, skip_special_tokens=True,
+                                        timeout=settings.LLM_STREAM_TIMEOUT_SECONDS)
+        stop_event = threading.Event()
+        errors: List[Exception] = []
+        loop = asyncio.get_running_loop()
+        started = asyncio.Event()
+        
+        def run_generation():
+            loop.call_soon_threadsafe(started.set)
+            if stop_event.is_set():
+                # The consumer is gone (cancelled while queued)
+                streamer.end()
+                return
+            try:
+                self._generate(
+                    **inputs,
+                    max_new_tokens=max_new_tokens,
+                    temperature=temperature,
+                    do_sample=do_sample,
+                    top_k=top_k,
+                    top_p=top_p,
+                    pad_token_id=self.tokenizer.eos_token_id,
+                    streamer=streamer,
+                    stopping_criteria=StoppingCriteriaList([_StopOnEvent(stop_event)])
+                )
+            except Exception as e:
+                errors.append(e)
+                # Unblock the consumer
+                streamer.end()
+        
+        inference_executor.submit(run_generation)
+        
+        generated = ""
+        try:
+            # Queued behind other generations on the inference executor, no thread held while waiting
+            await started.wait()
+            while True:
+                # The streamer blocks until the next chunk is decoded, wait for it off the event loop
+                chunk = await loop.run_in_executor(stream_executor, next, streamer, None)
+                if chunk is None:
+                    break
+                if not chunk:
+                    continue
+                generated += chunk
+                yield chunk
+                if any(pattern in generated for pattern in STOP_PATTERNS):
+                    break
+        finally:
+            stop_event.set()
+        
+        if errors:
+            raise errors[0]
+    
+    async def generate_streaming_response(
+        self, 
+        user_message: str, 
+        system_messages: List[Dict[str, str]] = None,
+        on_token: Optional[Callable[[str], Awaitable[None]]] = None
+    ) -> str:
+        """
+        Streaming variant of generate_contextual_response.
+        Calls on_token for every decoded chunk and returns the cleaned complete response.
+        
+        Args:
+            user_message: Current user message
+            system_messages: Previous conversation context
+            on_token: Coroutine function called with every newly decoded chunk
+            
+        Returns:
+            str: Generated response
+        """
+        try:
+            generated = ""
+            async for chunk in self.stream_tokens(
+                user_message=user_message,
+                system_messages=system_messages or [],
+                max_new_tokens=100,
+                temperature=0.8,
+                do_sample=True,
+                top_k=40,
+                top_p=0.9
+            ):
+                generated += chunk
+                if on_token is not None:
+                    await on_token(chunk)
+            
+            response = self._clean_response(generated)
+            logger.info(f"Generated response length: {len(response)} characters")
+            return response
+            
+        except Exception as e:
+            # Raised so the message is recorded as failed, not completed with an apology
+            logger.error(f"Error streaming response: {repr(e)}")
+            raise
+    
     def _clean_response(self, response: str) -> str:
         """
         Clean and format the generated response.
@@ -190,8 +501,7 @@ class LLMService:
         response = response.strip()
         
         # Stop at first occurrence of these patterns that might indicate end of response
-        stop_patterns = ["\n\nUser:", "\nUser:", "\n\nCurrent user", "\nCurrent user"]
-        for pattern in stop_patterns:
+        for pattern in STOP_PATTERNS:
             if pattern in response:
                 response = response.split(pattern)[0].strip()
         
@@ -249,3 +559,24 @@ async def get_llm_response(user_message: str, system_messages: List[Dict[str, st
     except Exception as e:
         logger.error(f"Error getting LLM response: {str(e)}")
         return "I apologize, but I encountered an error while processing your message. Please try again."
+
+
+async def stream_llm_response(
+    user_message: str, 
+    system_messages: List[Dict[str, str]] = None,
+    on_token: Optional[Callable[[str], Awaitable[None]]] = None
+) -> str:
+    """
+    Convenience function to get LLM response while streaming partial output.
+    
+    Args:
+        user_message: Current user message
+        system_messages: Previous conversation context
+        on_token: Coroutine function called with every newly decoded chunk
+        
+    Returns:
+        str: Generated response
+    Raises:
+        Exception: Generation failed or timed out, the caller marks the message as failed
+    """
+    return await llm_service.generate_streaming_response(user_message, system_messages, on_token)
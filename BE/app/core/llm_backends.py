@@ -0,0 +1,123 @@
+'''
+    GPT-2 inference backends, selected with LLM_BACKEND:
+        eager: plain PyTorch model (reference for parity checks)
+        int8: dynamic int8 quantization of the linear layers (weights int8, activations quantized per batch)
+        compile: torch.compile of the forward pass (first calls of every new shape are slow, warm-up absorbs it)
+        onnx: ONNX Runtime session through optimum (optional dependency, exported once to LLM_ONNX_DIR)
+
+    Every backend exposes the transformers generate API, so LLMService does not branch on it except for the
+    prefix cache, which only PyTorch backends accept.
+    Parity and speed against eager: python -m benchmarks.llm_backends
+'''
+from app.core.config import settings
+from app.utils.logger import get_logger
+
+from typing import Any, Tuple
+import os
+import torch
+
+logger = get_logger("llm_backends")
+
+LLM_BACKENDS = ("eager", "int8", "compile", "onnx")
+
+# Backends that take a PyTorch past_key_values cache as generate input
+PREFIX_CACHE_BACKENDS = ("eager", "int8", "compile")
+
+# Lowest mean greedy agreement with eager accepted per backend (share of new tokens generated before the
+# first token that differs, see benchmarks.llm_backends): compile and onnx run the same float32 model and
+# must produce identical tokens, int8 logits differ slightly so its greedy paths may fork after a while
+LLM_PARITY_MIN_AGREEMENT = {
+    "eager": 1.0,
+    "compile": 1.0,
+    "onnx": 1.0,
+    "int8": 0.5
+}
+
+
+def load_eager(model_name: str, device: torch.device) -> Any:
+    from transformers import GPT2LMHeadModel
+    model = GPT2LMHeadModel.from_pretrained(model_name)
+    model.to(device)
+    model.eval()
+    return model
+
+
+def conv1d_to_linear(model: torch.nn.Module) -> torch.nn.Module:
+    """
+    GPT-2 implements its projections with transformers Conv1D (x @ W + b, W of shape (in, out)),
+    which quantize_dynamic does not recognize. Replace each one with the equivalent nn.Linear.
+    """
+    from transformers.pytorch_utils import Conv1D
+
+    for parent in list(model.modules()):
+        for name, child in list(parent.named_children()):
+            if not isinstance(child, Conv1D):
+                continue
+            in_features, out_features = child.weight.shape
+            linear = torch.nn.Linear(in_features, out_features)
+            linear.weight.data = child.weight.data.t().contiguous()
+            linear.bias.data = child.bias.data
+            setattr(parent, name, linear)
+    return model
+
+
+def load_int8(model_name: str, device: torch.device) -> Any:
+    if device.type != "cpu":
+        raise RuntimeError("Dynamic int8 quantization only runs on CPU")
+    model = conv1d_to_linear(load_eager(model_name, device))
+    # lm_head (768 x 50257) is the largest matmul of every step, it is quantized too.
+    # Its weight is tied to the input embeddings, which stay float
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def load_compile(model_name: str, device: torch.device) -> Any:
+    model = load_eager(model_name, device)
+    # Only the forward pass is compiled, generate keeps running its Python loop around it.
+    # dynamic=True: prompt lengths and cache sizes change on every call
+    model.forward = torch.compile(model.forward, dynamic=True)
+    return model
+
+
+def load_onnx(model_name: str, device: torch.device) -> Any:
+    if device.type != "cpu":
+        raise RuntimeError("The ONNX backend is set up for the CPU execution provider only")
+    from optimum.onnxruntime import ORTModelForCausalLM
+
+    export_dir = settings.LLM_ONNX_DIR
+    if os.path.isdir(export_dir) and os.listdir(export_dir):
+        return ORTModelForCausalLM.from_pretrained(export_dir, use_cache=True)
+    logger.info(f"Exporting {model_name} to ONNX in {export_dir}")
+    model = ORTModelForCausalLM.from_pretrained(model_name, export=True, use_cache=True)
+    model.save_pretrained(export_dir)
+    return model
+
+
+LOADERS = {
+    "eager": load_eager,
+    "int8": load_int8,
+    "compile": load_compile,
+    "onnx": load_onnx
+}
+
+
+def load_model(backend: str, model_name: str, device: torch.device) -> Tuple[Any, str]:
+    """
+    Load GPT-2 with the requested backend. Falls back to eager when the backend is unknown,
+    its dependencies are missing or it does not support the device, so a worker always comes up.
+    Returns:
+        (model, name of the backend actually loaded)
+    """
+    if backend not in LOADERS:
+        logger.warning(f"Unknown LLM backend '{backend}', using eager (one of {', '.join(LLM_BACKENDS)})")
+        backend = "eager"
+    try:
+        model = LOADERS[backend](model_name, device)
+    except ImportError as e:
+        logger.warning(f"LLM backend '{backend}' is not installed ({str(e)}), using eager")
+        return load_eager(model_name, device), "eager"
+    except RuntimeError as e:
+        if backend == "eager":
+            raise
+        logger.warning(f"LLM backend '{backend}' unavailable ({str(e)}), using eager")
+        return load_eager(model_name, device), "eager"
+    return model, backend
@@ -0,0 +1,384 @@
+from app.core.config import settings
+from app.core.vector_store_base import VectorMatch, VectorQueryResponse, VectorStoreManager
+from app.utils.executors import run_blocking
+from app.utils.logger import get_logger
+
+from typing import Any, Dict, List, Optional, Set
+import fcntl
+import json
+import os
+import threading
+import numpy as np
+
+logger = get_logger("local_vector_store")
+
+
+class LocalVectorStore(VectorStoreManager):
+    """
+    In-process vector store, alternative to Pinecone for offline use and tests.
+    Exact (brute force) cosine search on a float32 matrix, switching to an HNSW index
+    (hnswlib, optional dependency) once the store holds more than `ann_threshold` vectors.
+
+    Persisted in `directory`:
+        vectors.f32: memory-mapped float32 matrix, one row per vector
+        rows.jsonl: append-only log of {"id", "row", "metadata"}, last entry of an id wins
+    Shared by the worker processes using the same directory (e.g. the interactive and bulk worker
+    services): writers hold an exclusive flock on rows.jsonl and first apply the rows appended by
+    the others, so row numbers never collide; queries apply new rows before searching.
+    Scans, index builds and file writes are blocking, they run on the io executor like Pinecone calls
+    (never on the event loop), serialized by a lock since upserts reshape the in-memory state.
+
+    Metadata filters (Pinecone syntax) are resolved on in-memory indexes before scoring,
+    so only the matching rows are searched:
+        string values: $eq, $ne, $in, $nin
+        numeric values: $eq, $ne, $gt, $gte, $lt, $lte
+    """
+
+    def __init__(self, directory: str, dimension: int = 384, ann_threshold: int = 50000, initial_capacity: int = 1024):
+        self.directory = directory
+        self.dimension = dimension
+        self.ann_threshold = ann_threshold
+        self.initial_capacity = initial_capacity
+        self.vectors: Optional[np.memmap] = None
+        self.ids: List[str] = []
+        self.metadata: List[Dict[str, Any]] = []
+        self.rows: Dict[str, int] = {}
+        # Bytes of rows.jsonl already applied
+        self.rows_offset = 0
+        self.ann_index = None
+        self.lock = threading.Lock()
+        # field -> value -> rows, for string metadata
+        self.tag_index: Dict[str, Dict[str, Set[int]]] = {}
+        # field -> value per row (NaN when missing), for numeric metadata
+        self.numeric_columns: Dict[str, np.ndarray] = {}
+
+    @property
+    def vectors_path(self) -> str:
+        return os.path.join(self.directory, "vectors.f32")
+
+    @property
+    def rows_path(self) -> str:
+        return os.path.join(self.directory, "rows.jsonl")
+
+    async def initialize_connection(self, dimension: int = 384, **kwargs) -> None:
+        """
+        Open (or create) the store on disk.
+        Args:
+            dimension: Dimension of the embeddings
+        """
+        if self.is_initialized():
+            logger.info(f"Local vector store already initialized at '{self.directory}'")
+            return
+        await run_blocking(self._open_store, dimension)
+
+    def _open_store(self, dimension: int) -> None:
+        with self.lock:
+            if self.is_initialized():
+                return
+            self._load(dimension)
+
+    def _load(self, dimension: int) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        self.dimension = dimension
+        open(self.rows_path, "ab").close()
+        self._read_rows()
+        self._open_vectors(self._required_capacity())
+
+        if len(self.ids) > self.ann_threshold:
+            self._build_ann_index()
+
+        logger.info(f"Local vector store opened at '{self.directory}' with {len(self.ids)} vectors")
+
+    def _read_rows(self) -> List[int]:
+        """
+        Apply the rows appended to rows.jsonl since the last read (possibly by other processes).
+        Returns:
+            The rows applied
+        """
+        applied = []
+        with open(self.rows_path, "rb") as rows_file:
+            rows_file.seek(self.rows_offset)
+            for line in rows_file:
+                # A line being written by another process, read on the next refresh
+                if not line.endswith(b"\n"):
+                    break
+                self.rows_offset += len(line)
+                entry = json.loads(line)
+                row = entry["row"]
+                while len(self.ids) <= row:
+                    self.ids.append("")
+                    self.metadata.append({})
+                self._unindex_metadata(row)
+                self.ids[row] = entry["id"]
+                self.metadata[row] = entry.get("metadata") or {}
+                self.rows[entry["id"]] = row
+                self._index_metadata(row)
+                applied.append(row)
+        return applied
+
+    def _required_capacity(self) -> int:
+        capacity = self.initial_capacity
+        if os.path.exists(self.vectors_path):
+            capacity = max(capacity, os.path.getsize(self.vectors_path) // (4 * self.dimension))
+        while capacity < len(self.ids):
+            capacity *= 2
+        return capacity
+
+    def _refresh(self) -> None:
+        """
+        Catch up with the vectors upserted by other processes.
+        Their vectors are written before their rows, so every row read has its vector on disk.
+        """
+        if os.path.getsize(self.rows_path) == self.rows_offset:
+            return
+        applied = self._read_rows()
+        if not applied:
+            return
+        if len(self.ids) > self.vectors.shape[0]:
+            # Another process grew the matrix
+            self._open_vectors(self._required_capacity())
+            if self.ann_index is not None:
+                self.ann_index.resize_index(self.vectors.shape[0])
+        if self.ann_index is not None:
+            rows = np.unique(applied)
+            self.ann_index.add_items(np.asarray(self.vectors[rows]), rows)
+        elif len(self.ids) > self.ann_threshold:
+            self._build_ann_index()
+
+    def _open_vectors(self, capacity: int) -> None:
+        if self.vectors is not None:
+            self.vectors.flush()
+            self.vectors = None
+        required_size = capacity * self.dimension * 4
+        with open(self.vectors_path, "ab") as vectors_file:
+            if vectors_file.tell() < required_size:
+                vectors_file.truncate(required_size)
+        self.vectors = np.memmap(self.vectors_path, dtype=np.float32, mode="r+", shape=(capacity, self.dimension))
+
+    def _index_metadata(self, row: int) -> None:
+        for field, value in self.metadata[row].items():
+            if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+                continue
+            if isinstance(value, str):
+                self.tag_index.setdefault(field, {}).setdefault(value, set()).add(row)
+                continue
+            column = self.numeric_columns.get(field)
+            if column is None or column.shape[0] <= row:
+                size = max(self.initial_capacity, row + 1, 2 * (column.shape[0] if column is not None else 0))
+                grown = np.full(size, np.nan)
+                if column is not None:
+                    grown[:column.shape[0]] = column
+                column = self.numeric_columns[field] = grown
+            column[row] = value
+
+    def _unindex_metadata(self, row: int) -> None:
+        if row >= len(self.metadata):
+            return
+        for field, value in self.metadata[row].items():
+            if isinstance(value, str):
+                self.tag_index.get(field, {}).get(value, set()).discard(row)
+            elif field in self.numeric_columns and row < self.numeric_columns[field].shape[0]:
+                self.numeric_columns[field][row] = np.nan
+
+    def _filter_rows(self, filter_dict: Dict[str, Any]) -> np.ndarray:
+        """
+        Resolve a metadata filter to the sorted rows matching all of its conditions.
+        Raises:
+            ValueError: On operators or value types the local store does not support
+        """
+        count = len(self.ids)
+        mask = np.ones(count, dtype=bool)
+        for field, condition in filter_dict.items():
+            if not isinstance(condition, dict):
+                condition = {"$eq": condition}
+            for operator, operand in condition.items():
+                if isinstance(operand, str) or (isinstance(operand, list) and all(isinstance(item, str) for item in operand)):
+                    values = operand if isinstance(operand, list) else [operand]
+                    field_mask = np.zeros(count, dtype=bool)
+                    for value in values:
+                        rows = self.tag_index.get(field, {}).get(value)
+                        if rows:
+                            field_mask[np.fromiter(rows, dtype=np.int64)] = True
+                    if operator in ("$eq", "$in"):
+                        mask &= field_mask
+                    elif operator in ("$ne", "$nin"):
+                        mask &= ~field_mask
+                    else:
+                        raise ValueError(f"Unsupported operator {operator} on string field {field}")
+                elif isinstance(operand, (int, float)) and not isinstance(operand, bool):
+                    column = self.numeric_columns.get(field)
+                    if column is None:
+                        column = np.full(count, np.nan)
+                    column = column[:count]
+                    if column.shape[0] < count:
+                        column = np.concatenate([column, np.full(count - column.shape[0], np.nan)])
+                    with np.errstate(invalid="ignore"):
+                        if operator == "$eq":
+                            mask &= column == operand
+                        elif operator == "$ne":
+                            mask &= column != operand
+                        elif operator == "$gt":
+                            mask &= column > operand
+                        elif operator == "$gte":
+                            mask &= column >= operand
+                        elif operator == "$lt":
+                            mask &= column < operand
+                        elif operator == "$lte":
+                            mask &= column <= operand
+                        else:
+                            raise ValueError(f"Unsupported operator {operator} on numeric field {field}")
+                else:
+                    raise ValueError(f"Unsupported filter value for field {field}: {operand!r}")
+        return np.flatnonzero(mask)
+
+    def _build_ann_index(self) -> None:
+        try:
+            import hnswlib
+        except ImportError:
+            logger.warning("hnswlib is not installed, local vector store stays on exact search")
+            self.ann_threshold = float("inf")
+            return
+
+        count = len(self.ids)
+        self.ann_index = hnswlib.Index(space="ip", dim=self.dimension)
+        self.ann_index.init_index(max_elements=self.vectors.shape[0], ef_construction=200, M=16)
+        self.ann_index.add_items(np.asarray(self.vectors[:count]), np.arange(count))
+        self.ann_index.set_ef(64)
+        logger.info(f"Built HNSW index over {count} vectors")
+
+    @staticmethod
+    def _normalize(values: Any) -> np.ndarray:
+        vector = np.asarray(values, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    async def upsert_vectors(self, vectors: List[Dict[str, Any]]) -> None:
+        """
+        Upsert vectors to the local store.
+        Args:
+            vectors: List of vector dictionaries with id, values, and metadata
+        """
+        if not self.is_initialized():
+            raise RuntimeError("Local vector store not initialized while upserting vectors")
+        await run_blocking(self._upsert, vectors)
+
+    def _upsert(self, vectors: List[Dict[str, Any]]) -> None:
+        with self.lock, open(self.rows_path, "ab") as rows_file:
+            # Exclusive across processes, rows are numbered after the ones the others appended
+            fcntl.flock(rows_file, fcntl.LOCK_EX)
+            try:
+                self._refresh()
+                self._write_vectors(vectors, rows_file)
+            finally:
+                fcntl.flock(rows_file, fcntl.LOCK_UN)
+
+    def _write_vectors(self, vectors: List[Dict[str, Any]], rows_file) -> None:
+        entries = []
+        for vector in vectors:
+            vector_id = vector["id"]
+            row = self.rows.get(vector_id)
+            if row is None:
+                row = len(self.ids)
+                if row >= self.vectors.shape[0]:
+                    self._open_vectors(self.vectors.shape[0] * 2)
+                    if self.ann_index is not None:
+                        self.ann_index.resize_index(self.vectors.shape[0])
+                self.ids.append(vector_id)
+                self.metadata.append({})
+                self.rows[vector_id] = row
+
+            values = self._normalize(vector["values"])
+            self.vectors[row] = values
+            self._unindex_metadata(row)
+            self.metadata[row] = vector.get("metadata") or {}
+            self._index_metadata(row)
+            if self.ann_index is not None:
+                self.ann_index.add_items(values.reshape(1, -1), np.array([row]))
+            entries.append(json.dumps({"id": vector_id, "row": row, "metadata": self.metadata[row]}))
+
+        # Vectors are written before their rows, a row never points to a missing vector
+        self.vectors.flush()
+        data = ("\n".join(entries) + "\n").encode("utf-8")
+        rows_file.write(data)
+        rows_file.flush()
+        self.rows_offset += len(data)
+
+        if self.ann_index is None and len(self.ids) > self.ann_threshold:
+            self._build_ann_index()
+
+    async def query_vectors(self, vector: List[float], top_k: int = 5,
+                            filter_dict: Optional[Dict[str, Any]] = None,
+                            include_metadata: bool = True) -> VectorQueryResponse:
+        """
+        Query vectors from the local store.
+
+        Args:
+            vector: Query vector
+            top_k: Number of top results to return
+            filter_dict: Optional metadata filter (Pinecone syntax, see class docstring)
+            include_metadata: Whether to include metadata in results
+
+        Returns:
+            VectorQueryResponse: Matches sorted by cosine score, best first
+        """
+        if not self.is_initialized():
+            raise RuntimeError("Local vector store not initialized while querying vectors")
+        return await run_blocking(self._query, vector, top_k, filter_dict, include_metadata)
+
+    def _query(self, vector: List[float], top_k: int, filter_dict: Optional[Dict[str, Any]],
+               include_metadata: bool) -> VectorQueryResponse:
+        with self.lock:
+            self._refresh()
+            return self._search(vector, top_k, filter_dict, include_metadata)
+
+    def _search(self, vector: List[float], top_k: int, filter_dict: Optional[Dict[str, Any]],
+                include_metadata: bool) -> VectorQueryResponse:
+        count = len(self.ids)
+        candidates = self._filter_rows(filter_dict) if filter_dict else None
+        candidate_count = count if candidates is None else len(candidates)
+        if candidate_count == 0 or top_k <= 0:
+            return VectorQueryResponse([])
+
+        query = self._normalize(vector)
+        k = min(top_k, candidate_count)
+
+        if self.ann_index is not None and candidate_count > self.ann_threshold:
+            allowed = None
+            if candidates is not None:
+                allowed = np.zeros(count, dtype=bool)
+                allowed[candidates] = True
+            labels, distances = self.ann_index.knn_query(
+                query, k=k, filter=(lambda label: bool(allowed[label])) if allowed is not None else None
+            )
+            rows = labels[0]
+            scores = 1.0 - distances[0]
+        else:
+            # Exact search, restricted to the rows matching the filter
+            matrix = np.asarray(self.vectors[:count]) if candidates is None else self.vectors[candidates]
+            all_scores = matrix @ query
+            top = np.argpartition(-all_scores, k - 1)[:k]
+            top = top[np.argsort(-all_scores[top])]
+            rows = top if candidates is None else candidates[top]
+            scores = all_scores[top]
+
+        return VectorQueryResponse([
+            VectorMatch(
+                id=self.ids[row],
+                score=float(score),
+                metadata=self.metadata[row] if include_metadata else None
+            )
+            for row, score in zip(rows, scores)
+        ])
+
+    def is_initialized(self) -> bool:
+        return self.vectors is not None
+
+    async def close(self) -> None:
+        if self.vectors is not None:
+            await run_blocking(self.vectors.flush)
+
+
+local_vector_store = LocalVectorStore(
+    settings.LOCAL_VECTOR_STORE_DIR,
+    ann_threshold=settings.LOCAL_VECTOR_STORE_ANN_THRESHOLD
+)
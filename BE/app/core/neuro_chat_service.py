@@ -2,47 +2,82 @@ from app.dtos.error_success_codes import ErrorAndSuccessCodes
 from app.dtos.collection_names import ChatOwners, CollectionNames
 from app.utils.db_query import MongoQueryApplicator
 from app.utils.logger import get_logger
-from app.dtos.neuro_chat_dtos import MessageList, SendMessageRequest, SendMessageResponse, GetMessagesStatusRequest, GetMessagesStatusResponse, MessageStatus
+from app.dtos.neuro_chat_dtos import MessageList, SendMessageRequest, SendMessageResponse, SendMessagesRequest, SendMessagesResponse, GetMessagesStatusRequest, GetMessagesStatusResponse, MessageStatus
 from app.core.config import settings
-from app.core.worker import process_message_task 
-from app.utils.generic_utils import convert_string_ids_to_object_ids
+from app.core.worker import process_message_task, process_messages_task
+from app.core.pubsub import pubsub, message_status_channel
+from app.core.rate_limiter import admission_controller
+from app.core.task_queues import BULK, INTERACTIVE, queue_for_user
+from app.utils.user_cache import user_cache
+from app.utils.generic_utils import convert_string_ids_to_object_ids, encode_page_cursor, decode_page_cursor
 
-from typing import List
+from celery import group
+from collections import Counter
+from typing import AsyncIterator, List, Optional, Tuple, Union
 from bson import ObjectId
 from datetime import datetime
 import asyncio
+import json
 import uuid
 
 logger = get_logger("neuro_chat_service")
 
+RATE_LIMITED_RESPONSE = "Too many messages right now, please try again in a moment."
+BATCH_TOO_LARGE_RESPONSE = "Too many messages for this user in one request, please split the request."
 
-async def get_user_messages(user_id, page_number) -> List[MessageList]: 
+# Fields returned by getChat
+CHAT_HISTORY_PROJECTION = {
+    "user_message": 1,
+    "system_message": 1,
+    "system_message_status": 1,
+    "timestamp": 1,
+    "created_at": 1
+}
+
+
+async def get_user_messages(user_id, page_number, cursor: Optional[str] = None) -> Tuple[List[MessageList], Optional[str]]: 
+    """
+    Fetch a page of the user's chat messages, oldest first.
+    Pages are selected by `cursor` (keyset pagination, constant cost at any depth) when given,
+    by `page_number` (skip based) otherwise.
+    Returns:
+        The messages and the cursor of the next page (None on the last page)
+    """
     try:
-        # First, validate if user exists
-        query = {"_id" : ObjectId(user_id)}
-        mongo = MongoQueryApplicator(CollectionNames.USERS.value)
-        users = await mongo.find(query)
-        print("users", users)
-        if not users or len(users) == 0:
+        # First, validate if user exists (cached, see user_cache)
+        if not await user_cache.exists(user_id):
             logger.info(f"No User Found User Id : {user_id}")
-            return []
+            return [], None
         
         # Fetch chat messages for the user with pagination
         messages_per_page = settings.MESSAGES_PER_PAGE
-        skip = (page_number - 1) * messages_per_page
         
         # Query chat messages for the user
         chat_query = {"user_id": ObjectId(user_id)}
         chat_mongo = MongoQueryApplicator(CollectionNames.CHAT.value)
         
-        # Fetch messages with pagination and sorting (ascending order by timestamp)
-        chat_messages = await chat_mongo.find_paginated(
-            filters=chat_query,
-            skip=skip,
-            limit=messages_per_page,
-            sort_field="timestamp",
-            sort_order=1  # 1 for ascending (oldest first)
-        )
+        # Fetch messages sorted by (created_at, _id) ascending (oldest first)
+        if cursor:
+            after = decode_page_cursor(cursor)
+            if after is None:
+                return [], None
+            chat_messages = await chat_mongo.find_after(
+                filters=chat_query,
+                sort_field="created_at",
+                after=after,
+                limit=messages_per_page,
+                sort_order=1,
+                projection=CHAT_HISTORY_PROJECTION
+            )
+        else:
+            chat_messages = await chat_mongo.find_paginated(
+                filters=chat_query,
+                skip=(page_number - 1) * messages_per_page,
+                limit=messages_per_page,
+                sort_field="created_at",
+                sort_order=1,  # 1 for ascending (oldest first)
+                projection=CHAT_HISTORY_PROJECTION
+            )
         
         # Transform database documents to MessageList DTOs
         res: List[MessageList] = []
@@ -52,16 +87,20 @@ async def get_user_messages(user_id, page_number) -> List[MessageList]:
                 user_message=message.get("user_message", ""),
                 system_message=message.get("system_message", ""),
                 system_message_status=message.get("system_message_status", ErrorAndSuccessCodes.SUCCESS),
-                timestamp=message.get("timestamp", datetime.utcnow())
+                timestamp=message.get("timestamp") or message.get("created_at") or datetime.utcnow()
             )
             res.append(message_dto)
         
-        logger.info(f"Successfully fetched {len(res)} messages for user {user_id}, page {page_number}")
-        return res
+        next_cursor = None
+        if len(chat_messages) == messages_per_page and chat_messages[-1].get("created_at"):
+            next_cursor = encode_page_cursor(chat_messages[-1]["created_at"], chat_messages[-1]["_id"])
+        
+        logger.info(f"Successfully fetched {len(res)} messages for user {user_id}, page {page_number}, cursor {cursor}")
+        return res, next_cursor
         
     except Exception as e:
-        logger.error(f"Error while fetching messages: {e}, USER ID: {user_id}, PAGE NUMBER: {page_number}")
-        return []
+        logger.error(f"Error while fetching messages: {e}, USER ID: {user_id}, PAGE NUMBER: {page_number}, CURSOR: {cursor}")
+        return [], None
 
 async def send_message_to_system(request: SendMessageRequest) -> SendMessageResponse:
     """
@@ -75,12 +114,8 @@ async def send_message_to_system(request: SendMessageRequest) -> SendMessageResp
     message_id = None
     
     try:
-        # First, validate if user exists
-        user_query = {"_id": ObjectId(request.user_id)}
-        user_mongo = MongoQueryApplicator(CollectionNames.USERS.value)
-        users = await user_mongo.find(user_query)
-        
-        if not users or len(users) == 0:
+        # First, validate if user exists (cached, see user_cache)
+        if not await user_cache.exists(request.user_id):
             logger.info(f"No User Found User Id : {request.user_id}")
             return SendMessageResponse(
                 status="error",
@@ -89,6 +124,16 @@ async def send_message_to_system(request: SendMessageRequest) -> SendMessageResp
                 internal_status_code=ErrorAndSuccessCodes.INVALID_INPUT
             )
         
+        # Reject early when the backlog or the user / global rate limits are exhausted
+        rejection = await admission_controller.admit(request.user_id)
+        if rejection:
+            return SendMessageResponse(
+                status="error",
+                message_id="",
+                system_response=RATE_LIMITED_RESPONSE,
+                internal_status_code=rejection
+            )
+        
         # Save user message to chats collection
         mongo = MongoQueryApplicator(CollectionNames.CHAT.value)
         message_id = await mongo.insert_one({
@@ -103,7 +148,7 @@ async def send_message_to_system(request: SendMessageRequest) -> SendMessageResp
         logger.info(f"Message saved to database with ID: {message_id} for user: {request.user_id}")
         
         # Send to Celery task queue for processing
-        CeleryTaskQueue().process_message(message_id)
+        CeleryTaskQueue().process_message(message_id, request.user_id)
         
         return SendMessageResponse(
             status="success",
@@ -135,9 +180,131 @@ async def send_message_to_system(request: SendMessageRequest) -> SendMessageResp
         )
 
 
+def bulk_item_response(outcome: Union[str, ErrorAndSuccessCodes, None]) -> SendMessageResponse:
+    """
+    Response of one sendMessages item: its message_id when queued,
+    the rejection code when rate limited (INVALID_INPUT: more messages than the burst), None when the user was not found.
+    """
+    if isinstance(outcome, str):
+        return SendMessageResponse(
+            status="success",
+            message_id=outcome,
+            system_response="Message received and is being processed",
+            internal_status_code=ErrorAndSuccessCodes.SUCCESS
+        )
+    if outcome is not None:
+        return SendMessageResponse(
+            status="error",
+            message_id="",
+            system_response=BATCH_TOO_LARGE_RESPONSE if outcome == ErrorAndSuccessCodes.INVALID_INPUT else RATE_LIMITED_RESPONSE,
+            internal_status_code=outcome
+        )
+    return SendMessageResponse(
+        status="error",
+        message_id="",
+        system_response="User not found",
+        internal_status_code=ErrorAndSuccessCodes.INVALID_INPUT
+    )
+
+
+async def send_messages_to_system(request: SendMessagesRequest) -> SendMessagesResponse:
+    """
+    Bulk version of send_message_to_system.
+    Users are validated together, messages are saved with one insert_many and enqueued
+    BULK_MESSAGES_PER_TASK per task, all tasks being published together.
+    Args:
+        request (SendMessagesRequest): Messages with their user_id
+    Returns:
+        SendMessagesResponse: One SendMessageResponse per message, in request order
+    """
+    if not request.messages or len(request.messages) > settings.BULK_MAX_MESSAGES:
+        logger.info(f"Rejected bulk request of {len(request.messages)} messages, limit: {settings.BULK_MAX_MESSAGES}")
+        return SendMessagesResponse(status="error", data=[], internal_status_code=ErrorAndSuccessCodes.INVALID_INPUT)
+
+    mongo = MongoQueryApplicator(CollectionNames.CHAT.value)
+    documents = []
+
+    try:
+        # Validate every distinct user once (cached, see user_cache)
+        user_ids = [item.user_id for item in request.messages if ObjectId.is_valid(item.user_id)]
+        existing_users = await user_cache.exists_many(user_ids)
+
+        # Admission: bulk rate limits per user for its messages (bulk queues are not backlog checked)
+        messages_per_user = Counter(item.user_id for item in request.messages if existing_users.get(item.user_id))
+        rejections = {}
+        for user_id, count in messages_per_user.items():
+            rejections[user_id] = await admission_controller.check_rate(user_id, count, BULK)
+
+        # _ids are assigned here so that failed inserts can still be marked
+        now = datetime.now()
+        outcomes = []
+        for item in request.messages:
+            if not existing_users.get(item.user_id):
+                outcomes.append(None)
+                continue
+            if rejections[item.user_id]:
+                outcomes.append(rejections[item.user_id])
+                continue
+            documents.append({
+                '_id': ObjectId(),
+                'user_id': ObjectId(item.user_id),
+                'user_message': item.message,
+                'system_message': "",
+                'system_message_status': ErrorAndSuccessCodes.MESSAGE_UNDER_PROCESSING.value,
+                'created_at': now,
+                'updated_at': now
+            })
+            outcomes.append(str(documents[-1]['_id']))
+
+        if documents:
+            await mongo.insert_many(documents)
+            CeleryTaskQueue().process_messages([(str(document['_id']), str(document['user_id'])) for document in documents])
+        logger.info(f"Bulk saved and queued {len(documents)} of {len(request.messages)} messages")
+
+        return SendMessagesResponse(
+            status="success",
+            data=[bulk_item_response(outcome) for outcome in outcomes],
+            internal_status_code=ErrorAndSuccessCodes.SUCCESS
+        )
+
+    except Exception as e:
+        logger.error(f"Error while processing bulk messages: {e}")
+        # Mark the messages that may have been saved as failed
+        if documents:
+            try:
+                await mongo.update_many(
+                    {"_id": {"$in": [document['_id'] for document in documents]}},
+                    {
+                        'system_message_status': ErrorAndSuccessCodes.PROCESSING_ERROR.value,
+                        'system_message': "Error processing message"
+                    }
+                )
+            except Exception as update_error:
+                logger.error(f"Error updating message statuses: {update_error}")
+
+        return SendMessagesResponse(status="error", data=[], internal_status_code=ErrorAndSuccessCodes.PROCESSING_ERROR)
+
+
 class CeleryTaskQueue:
-    def process_message(self, message_id):
-        return process_message_task.delay(message_id)
+    def process_message(self, message_id, user_id):
+        # Interactive class, the user's shard (see task_queues)
+        return process_message_task.apply_async((message_id,), queue=queue_for_user(INTERACTIVE, user_id))
+
+    def process_messages(self, messages):
+        """
+        Enqueue (message_id, user_id) pairs on the bulk class: messages are grouped by
+        the shard of their user, then chunked BULK_MESSAGES_PER_TASK per task.
+        The group publishes all tasks over a single producer connection.
+        """
+        shards = {}
+        for message_id, user_id in messages:
+            shards.setdefault(queue_for_user(BULK, user_id), []).append(message_id)
+        chunk_size = max(1, settings.BULK_MESSAGES_PER_TASK)
+        return group(
+            process_messages_task.signature((message_ids[i:i + chunk_size],), queue=queue)
+            for queue, message_ids in shards.items()
+            for i in range(0, len(message_ids), chunk_size)
+        ).apply_async()
     
 async def get_messages_status(request: GetMessagesStatusRequest) -> GetMessagesStatusResponse:
     '''
@@ -157,6 +324,7 @@ async def get_messages_status(request: GetMessagesStatusRequest) -> GetMessagesS
     mongo = MongoQueryApplicator(CollectionNames.CHAT.value)
     messages = await mongo.find(
         {"_id": {"$in": object_ids}, "user_id": ObjectId(request.user_id)},
+        projection={"system_message_status": 1, "system_message": 1}
     )
     
     for message in messages:
@@ -171,3 +339,31 @@ async def get_messages_status(request: GetMessagesStatusRequest) -> GetMessagesS
         status="success",
         data=res
     )
+
+async def stream_messages_status(user_id: str, is_disconnected) -> AsyncIterator[str]:
+    '''
+        Server-Sent Events stream of message status updates for a user.
+        Events are pushed by the Celery worker through Pub/Sub, no DB work is done per client.
+        Args:
+            user_id: User whose messages are followed
+            is_disconnected: Coroutine function returning True once the client went away
+    '''
+    logger.info(f"Message status stream opened, User ID: {user_id}")
+    events = pubsub.subscribe(message_status_channel(user_id), timeout=settings.PUBSUB_HEARTBEAT_SECONDS)
+    try:
+        # Subscribe first (the first item is yielded once the subscription is active),
+        # then tell the client it can safely send messages
+        await events.__anext__()
+        yield "event: ready\ndata: {}\n\n"
+        async for event in events:
+            if await is_disconnected():
+                break
+            if event is None:
+                # Heartbeat, keeps proxies from closing idle connections
+                yield ": keep-alive\n\n"
+                continue
+            # message_status: final status, message_token: partial system response
+            yield f"event: message_{event.get('type', 'status')}\ndata: {json.dumps(event)}\n\n"
+    finally:
+        await events.aclose()
+        logger.info(f"Message status stream closed, User ID: {user_id}")
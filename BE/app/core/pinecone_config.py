@@ -1,11 +1,13 @@
 from app.core.config import settings 
+from app.core.vector_store_base import VectorStoreManager
+from app.utils.executors import run_blocking
 
 import os
 import json
 from typing import Optional, List, Dict, Any, Union
 from pinecone import Pinecone, ServerlessSpec
 
-class PineconeManager:
+class PineconeManager(VectorStoreManager):
     """
     Pinecone connection manager for the application.
     Handles index management and lifecycle.
@@ -111,10 +113,14 @@ class PineconeManager:
                 "id": vector["id"],
                 "values": vector["values"]
             }
+            # Metadata (user_id, created_at) is used to scope queries
+            if vector.get("metadata"):
+                processed_vector["metadata"] = vector["metadata"]
             
             processed_vectors.append(processed_vector)
         
-        self.index.upsert(vectors=processed_vectors)  # type: ignore
+        # Pinecone client is synchronous, keep the event loop free
+        await run_blocking(self.index.upsert, vectors=processed_vectors)  # type: ignore
     
     async def query_vectors(self, vector: List[float], top_k: int = 5, 
                      filter_dict: Optional[Dict[str, Any]] = None,
@@ -134,7 +140,8 @@ class PineconeManager:
         if self.index is None:
             raise RuntimeError("Pinecone connection not initialized while querying vectors")
         
-        return self.index.query(
+        return await run_blocking(
+            self.index.query,
             vector=vector,
             top_k=top_k,
             filter=filter_dict,
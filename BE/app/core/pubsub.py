@@ -0,0 +1,125 @@
+from app.core.config import settings
+from app.utils.logger import get_logger
+
+from abc import ABC, abstractmethod
+from typing import Any, AsyncIterator, Dict, Optional, Set
+import asyncio
+import json
+
+logger = get_logger("pubsub")
+
+
+def message_status_channel(user_id: str) -> str:
+    """
+    Channel on which status updates of a user's messages are published.
+    """
+    return f"neuro_chat:messages:{user_id}"
+
+
+class PubSubManager(ABC):
+    """
+    Base Pub/Sub manager.
+    The Celery worker publishes message status updates, the API subscribes
+    and pushes them to connected clients (no polling of MongoDB needed).
+    """
+
+    @abstractmethod
+    async def publish(self, channel: str, message: Dict[str, Any]) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def subscribe(self, channel: str, timeout: float) -> AsyncIterator[Optional[Dict[str, Any]]]:
+        """
+        Subscribe to a channel.
+        The generator only subscribes once iterated: its first item is None, yielded when the
+        subscription is active, so messages published after it are not missed.
+        Yields:
+            The published message, or None when nothing was received within `timeout` seconds
+            (lets the caller send heartbeats and detect disconnected clients)
+        """
+        raise NotImplementedError
+        yield  # pragma: no cover
+
+    async def close(self) -> None:
+        return None
+
+
+class InMemoryPubSub(PubSubManager):
+    """
+    In-process Pub/Sub. Only delivers within a single process,
+    used for local testing without Redis.
+    """
+
+    def __init__(self):
+        self.subscribers: Dict[str, Set[asyncio.Queue]] = {}
+
+    async def publish(self, channel: str, message: Dict[str, Any]) -> None:
+        for queue in list(self.subscribers.get(channel, ())):
+            queue.put_nowait(message)
+
+    async def subscribe(self, channel: str, timeout: float) -> AsyncIterator[Optional[Dict[str, Any]]]:
+        queue: asyncio.Queue = asyncio.Queue()
+        self.subscribers.setdefault(channel, set()).add(queue)
+        try:
+            yield None
+            while True:
+                try:
+                    yield await asyncio.wait_for(queue.get(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    yield None
+        finally:
+            self.subscribers[channel].discard(queue)
+            if not self.subscribers[channel]:
+                del self.subscribers[channel]
+
+
+class RedisPubSub(PubSubManager):
+    """
+    Redis backed Pub/Sub, shared by the API replicas and the Celery workers.
+    """
+
+    def __init__(self, url: str):
+        self.url = url
+        self.client = None
+
+    def get_client(self):
+        if self.client is None:
+            import redis.asyncio as aioredis
+            self.client = aioredis.from_url(self.url, decode_responses=True)
+        return self.client
+
+    async def publish(self, channel: str, message: Dict[str, Any]) -> None:
+        await self.get_client().publish(channel, json.dumps(message))
+
+    async def subscribe(self, channel: str, timeout: float) -> AsyncIterator[Optional[Dict[str, Any]]]:
+        pubsub = self.get_client().pubsub()
+        await pubsub.subscribe(channel)
+        try:
+            # Active once Redis confirmed the SUBSCRIBE
+            while (await pubsub.get_message(timeout=timeout) or {}).get("type") != "subscribe":
+                pass
+            yield None
+            while True:
+                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=timeout)
+                if message is None:
+                    yield None
+                    continue
+                yield json.loads(message["data"])
+        finally:
+            await pubsub.unsubscribe(channel)
+            await pubsub.close()
+
+    async def close(self) -> None:
+        if self.client is not None:
+            await self.client.close()
+            self.client = None
+
+
+def create_pubsub() -> PubSubManager:
+    if settings.PUBSUB_BACKEND == "memory":
+        logger.info("Using in-memory Pub/Sub backend")
+        return InMemoryPubSub()
+    return RedisPubSub(settings.PUBSUB_URL)
+
+
+pubsub = create_pubsub()
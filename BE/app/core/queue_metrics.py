@@ -0,0 +1,84 @@
+from app.core.config import settings
+from app.core.task_queues import queue_names
+from app.utils.logger import get_logger
+
+from typing import Any, Dict, List, Optional
+
+logger = get_logger("queue_metrics")
+
+
+def percentile(sorted_values: List[float], fraction: float) -> Optional[float]:
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+class QueueMetrics:
+    """
+    Wait time of messages per priority class, from their creation (right before they are enqueued)
+    until a worker claims them. Workers record into Redis, the API reports them along with
+    the current depth of the class queues, so the numbers cover every worker and consumer.
+    """
+
+    def __init__(self, url: str, sample_size: int = 1000):
+        self.url = url
+        self.sample_size = sample_size
+        self.client = None
+
+    def get_client(self):
+        if self.client is None:
+            import redis.asyncio as aioredis
+            self.client = aioredis.from_url(self.url, decode_responses=True)
+        return self.client
+
+    @staticmethod
+    def key(priority: str) -> str:
+        return f"neuro_chat:queue_wait:{priority}"
+
+    async def record(self, priority: str, wait_seconds: float) -> None:
+        """
+        Record the wait of one message. Best effort, never fails the pipeline.
+        """
+        try:
+            async with self.get_client().pipeline(transaction=False) as pipe:
+                pipe.hincrby(self.key(priority), "count", 1)
+                pipe.hincrbyfloat(self.key(priority), "total_seconds", wait_seconds)
+                pipe.lpush(f"{self.key(priority)}:recent", wait_seconds)
+                pipe.ltrim(f"{self.key(priority)}:recent", 0, self.sample_size - 1)
+                await pipe.execute()
+        except Exception as e:
+            logger.error(f"Failed to record {priority} queue wait: {str(e)}")
+
+    async def depth(self, priority: str) -> int:
+        """
+        Messages waiting in the queues of a priority class.
+        """
+        async with self.get_client().pipeline(transaction=False) as pipe:
+            for name in queue_names(priority):
+                pipe.llen(name)
+            return sum(await pipe.execute())
+
+    async def snapshot(self, priority: str) -> Dict[str, Any]:
+        """
+        Depth and wait statistics of a priority class (percentiles over the last `sample_size` messages).
+        """
+        client = self.get_client()
+        totals = await client.hgetall(self.key(priority))
+        recent = sorted(float(value) for value in await client.lrange(f"{self.key(priority)}:recent", 0, -1))
+        count = int(totals.get("count", 0))
+        return {
+            "depth": await self.depth(priority),
+            "processed": count,
+            "mean_wait_seconds": float(totals.get("total_seconds", 0)) / count if count else None,
+            "p50_wait_seconds": percentile(recent, 0.5),
+            "p95_wait_seconds": percentile(recent, 0.95),
+            "max_recent_wait_seconds": recent[-1] if recent else None
+        }
+
+    async def close(self) -> None:
+        if self.client is not None:
+            await self.client.close()
+            self.client = None
+
+
+queue_metrics = QueueMetrics(settings.BROKER_URL)
@@ -0,0 +1,225 @@
+from app.core.config import settings
+from app.core.queue_metrics import QueueMetrics, queue_metrics
+from app.core.task_queues import BULK, INTERACTIVE
+from app.dtos.error_success_codes import ErrorAndSuccessCodes
+from app.utils.logger import get_logger
+
+from abc import ABC, abstractmethod
+from typing import Dict, List, NamedTuple, Optional, Tuple
+import time
+
+logger = get_logger("rate_limiter")
+
+
+class TokenBucket(NamedTuple):
+    """
+    Refills `rate` tokens per second up to `capacity` (the allowed burst).
+    """
+    key: str
+    rate: float
+    capacity: float
+
+
+class RateLimiter(ABC):
+    """
+    Base token bucket rate limiter.
+    """
+
+    @abstractmethod
+    async def acquire(self, buckets: List[TokenBucket], cost: float = 1) -> Optional[int]:
+        """
+        Take `cost` tokens from every bucket, all or nothing.
+        Returns:
+            None if the tokens were taken, otherwise the index of the first bucket without enough tokens
+        """
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        return None
+
+
+class InMemoryRateLimiter(RateLimiter):
+    """
+    In-process buckets. Limits apply per API process, used for local testing without Redis.
+    """
+
+    def __init__(self):
+        # key -> (tokens, last refill time)
+        self.buckets: Dict[str, Tuple[float, float]] = {}
+
+    async def acquire(self, buckets: List[TokenBucket], cost: float = 1) -> Optional[int]:
+        now = time.monotonic()
+        levels = []
+        for index, bucket in enumerate(buckets):
+            tokens, refilled_at = self.buckets.get(bucket.key, (bucket.capacity, now))
+            tokens = min(bucket.capacity, tokens + (now - refilled_at) * bucket.rate)
+            if tokens < cost:
+                return index
+            levels.append(tokens)
+        for bucket, tokens in zip(buckets, levels):
+            self.buckets[bucket.key] = (tokens - cost, now)
+        return None
+
+
+class RedisRateLimiter(RateLimiter):
+    """
+    Redis backed buckets shared by all API replicas.
+    All buckets are checked and updated in one atomic script (one round trip),
+    with the Redis clock so replicas do not need synchronized clocks.
+    """
+
+    # KEYS: bucket keys, ARGV: cost, then rate and capacity of each bucket
+    SCRIPT = """
+    local clock = redis.call('TIME')
+    local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+    local cost = tonumber(ARGV[1])
+    local levels = {}
+    for i, key in ipairs(KEYS) do
+        local rate = tonumber(ARGV[2 * i])
+        local capacity = tonumber(ARGV[2 * i + 1])
+        local state = redis.call('HMGET', key, 'tokens', 'ts')
+        local tokens = tonumber(state[1]) or capacity
+        local refilled_at = tonumber(state[2]) or now
+        tokens = math.min(capacity, tokens + math.max(0, now - refilled_at) * rate)
+        if tokens < cost then
+            return i
+        end
+        levels[i] = tokens
+    end
+    for i, key in ipairs(KEYS) do
+        local rate = tonumber(ARGV[2 * i])
+        local capacity = tonumber(ARGV[2 * i + 1])
+        redis.call('HSET', key, 'tokens', tostring(levels[i] - cost), 'ts', tostring(now))
+        redis.call('EXPIRE', key, math.ceil(capacity / rate) + 1)
+    end
+    return 0
+    """
+
+    def __init__(self, url: str):
+        self.url = url
+        self.client = None
+        self.script = None
+
+    def get_script(self):
+        if self.script is None:
+            import redis.asyncio as aioredis
+            self.client = aioredis.from_url(self.url, decode_responses=True)
+            self.script = self.client.register_script(self.SCRIPT)
+        return self.script
+
+    async def acquire(self, buckets: List[TokenBucket], cost: float = 1) -> Optional[int]:
+        args = [cost]
+        for bucket in buckets:
+            args.extend([bucket.rate, bucket.capacity])
+        exhausted = await self.get_script()(keys=[bucket.key for bucket in buckets], args=args)
+        return int(exhausted) - 1 if exhausted else None
+
+    async def close(self) -> None:
+        if self.client is not None:
+            await self.client.close()
+            self.client = None
+            self.script = None
+
+
+class AdmissionController:
+    """
+    Decides if new messages are accepted, before they are saved and enqueued:
+    1. Backlog: rejected when the interactive queues already hold more messages than the workers
+       can clear within ADMISSION_LATENCY_TARGET_SECONDS (GLOBAL_RATE_LIMIT_EXHAUSTED).
+       Bulk messages have their own queues and are not backlog checked
+    2. Token buckets per user (USER_RATE_LIMIT_EXHAUSTED) and for all users (GLOBAL_RATE_LIMIT_EXHAUSTED).
+       Bulk messages are charged to separate buckets (RATE_LIMIT_BULK_*), so sendMessages neither starves
+       nor is starved by sendMessage. A request larger than a bucket's burst could never be admitted,
+       it is rejected up front with INVALID_INPUT instead of waiting for tokens
+    Fails open: if the limiter backend is unreachable, messages are accepted.
+    """
+
+    def __init__(self, limiter: RateLimiter, metrics: QueueMetrics):
+        self.limiter = limiter
+        self.metrics = metrics
+
+    def max_queue_depth(self) -> Optional[int]:
+        if settings.ADMISSION_LATENCY_TARGET_SECONDS <= 0:
+            return None
+        return int(settings.ADMISSION_LATENCY_TARGET_SECONDS / settings.ADMISSION_SECONDS_PER_MESSAGE)
+
+    def buckets(self, user_id: str, priority: str = INTERACTIVE) -> Tuple[List[TokenBucket], List[ErrorAndSuccessCodes]]:
+        if priority == BULK:
+            prefix = "neuro_chat:rate:bulk"
+            user_rate, user_burst = settings.RATE_LIMIT_BULK_USER_PER_SECOND, settings.RATE_LIMIT_BULK_USER_BURST
+            global_rate, global_burst = settings.RATE_LIMIT_BULK_GLOBAL_PER_SECOND, settings.RATE_LIMIT_BULK_GLOBAL_BURST
+        else:
+            prefix = "neuro_chat:rate"
+            user_rate, user_burst = settings.RATE_LIMIT_USER_PER_SECOND, settings.RATE_LIMIT_USER_BURST
+            global_rate, global_burst = settings.RATE_LIMIT_GLOBAL_PER_SECOND, settings.RATE_LIMIT_GLOBAL_BURST
+
+        buckets, codes = [], []
+        if user_rate > 0:
+            buckets.append(TokenBucket(f"{prefix}:user:{user_id}", user_rate, user_burst))
+            codes.append(ErrorAndSuccessCodes.USER_RATE_LIMIT_EXHAUSTED)
+        if global_rate > 0:
+            buckets.append(TokenBucket(f"{prefix}:global", global_rate, global_burst))
+            codes.append(ErrorAndSuccessCodes.GLOBAL_RATE_LIMIT_EXHAUSTED)
+        return buckets, codes
+
+    async def check_backlog(self, count: int = 1) -> Optional[ErrorAndSuccessCodes]:
+        """
+        Returns:
+            GLOBAL_RATE_LIMIT_EXHAUSTED if `count` more messages would exceed the backlog limit, None otherwise
+        """
+        max_depth = self.max_queue_depth()
+        if max_depth is None:
+            return None
+        try:
+            depth = await self.metrics.depth(INTERACTIVE)
+        except Exception as e:
+            logger.error(f"Failed to read the {INTERACTIVE} queue depth, admitting: {str(e)}")
+            return None
+        if depth + count > max_depth:
+            logger.warning(f"Backlog of {depth} {INTERACTIVE} messages exceeds {max_depth}, rejecting {count}")
+            return ErrorAndSuccessCodes.GLOBAL_RATE_LIMIT_EXHAUSTED
+        return None
+
+    async def check_rate(self, user_id: str, count: int = 1, priority: str = INTERACTIVE) -> Optional[ErrorAndSuccessCodes]:
+        """
+        Take `count` tokens from the user and global buckets of the priority class.
+        Returns:
+            The status code of the exhausted bucket, INVALID_INPUT if `count` exceeds a bucket's burst,
+            None if the messages are admitted
+        """
+        buckets, codes = self.buckets(user_id, priority)
+        if not buckets:
+            return None
+        for bucket in buckets:
+            if count > bucket.capacity:
+                logger.warning(f"{count} {priority} messages of user {user_id} exceed the burst of {bucket.key} ({bucket.capacity})")
+                return ErrorAndSuccessCodes.INVALID_INPUT
+        try:
+            exhausted = await self.limiter.acquire(buckets, cost=count)
+        except Exception as e:
+            logger.error(f"Rate limiter unavailable, admitting: {str(e)}")
+            return None
+        if exhausted is not None:
+            logger.info(f"Rate limited user {user_id}: {codes[exhausted].name}")
+            return codes[exhausted]
+        return None
+
+    async def admit(self, user_id: str, count: int = 1) -> Optional[ErrorAndSuccessCodes]:
+        """
+        Returns:
+            None if `count` messages of the user are admitted, the rejection status code otherwise
+        """
+        return await self.check_backlog(count) or await self.check_rate(user_id, count)
+
+    async def close(self) -> None:
+        await self.limiter.close()
+
+
+def create_rate_limiter() -> RateLimiter:
+    if settings.RATE_LIMIT_BACKEND == "memory":
+        logger.info("Using in-memory rate limiter backend")
+        return InMemoryRateLimiter()
+    return RedisRateLimiter(settings.RATE_LIMIT_URL)
+
+
+admission_controller = AdmissionController(create_rate_limiter(), queue_metrics)
@@ -0,0 +1,45 @@
+'''
+    Priority classes of message processing and their broker queues.
+
+    interactive: single messages from sendMessage, latency sensitive
+    bulk: chunks of messages from sendMessages, throughput oriented
+
+    Each class is split in QUEUE_SHARDS queues ("interactive.0", "interactive.1", ...), a user
+    always lands in the same shard. Consumers take messages from the shards of a class round robin
+    (Celery's Redis transport rotates the queues it reads, so does app.core.async_consumer), so one
+    heavy user only holds back the users sharing its shard instead of everyone.
+    Fairness is per shard, not per user: inside a shard messages are FIFO, so a user with a large
+    backlog delays every user hashed to the same shard until it is drained (raise QUEUE_SHARDS to
+    make those groups smaller).
+
+    Queue names of a class, for `celery worker -Q`:
+        python -m app.core.task_queues interactive
+'''
+from app.core.config import settings
+
+from typing import List
+import sys
+import zlib
+
+INTERACTIVE = "interactive"
+BULK = "bulk"
+PRIORITY_CLASSES = (INTERACTIVE, BULK)
+
+
+def queue_names(priority: str) -> List[str]:
+    """
+    All broker queues of a priority class.
+    """
+    return [f"{priority}.{shard}" for shard in range(max(1, settings.QUEUE_SHARDS))]
+
+
+def queue_for_user(priority: str, user_id: str) -> str:
+    """
+    Queue of the priority class holding the user's messages (stable hash of the user_id).
+    """
+    shard = zlib.crc32(str(user_id).encode("utf-8")) % max(1, settings.QUEUE_SHARDS)
+    return f"{priority}.{shard}"
+
+
+if __name__ == "__main__":
+    print(",".join(name for priority in (sys.argv[1:] or PRIORITY_CLASSES) for name in queue_names(priority)))
@@ -0,0 +1,17 @@
+from app.core.config import settings
+from app.core.vector_store_base import VectorStoreManager
+
+
+def create_vector_store() -> VectorStoreManager:
+    """
+    Vector store selected by VECTOR_STORE_BACKEND (pinecone | local).
+    """
+    if settings.VECTOR_STORE_BACKEND == "local":
+        from app.core.local_vector_store import local_vector_store
+        return local_vector_store
+
+    from app.core.pinecone_config import pinecone
+    return pinecone
+
+
+vector_store = create_vector_store()
@@ -0,0 +1,60 @@
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional
+
+
+class VectorMatch:
+    """
+    Single query match, same attributes as a Pinecone match.
+    """
+
+    def __init__(self, id: str, score: float, metadata: Optional[Dict[str, Any]] = None):
+        self.id = id
+        self.score = score
+        self.metadata = metadata or {}
+
+
+class VectorQueryResponse:
+    """
+    Query response, same shape as a Pinecone QueryResponse (matches sorted by score, best first).
+    """
+
+    def __init__(self, matches: List[VectorMatch]):
+        self.matches = matches
+
+
+class VectorStoreManager(ABC):
+    """
+    Contract of the vector stores used by the worker pipeline.
+    Vectors are normalized BAAI/bge-small-en-v1.5 embeddings, ids are chat message _ids.
+    """
+
+    @abstractmethod
+    async def initialize_connection(self, **kwargs) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def upsert_vectors(self, vectors: List[Dict[str, Any]]) -> None:
+        """
+        Upsert vectors.
+        Args:
+            vectors: List of vector dictionaries with id, values, and metadata
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    async def query_vectors(self, vector: List[float], top_k: int = 5,
+                            filter_dict: Optional[Dict[str, Any]] = None,
+                            include_metadata: bool = True) -> Any:
+        """
+        Query the top_k most similar vectors.
+        Returns:
+            Response with `matches` (id, score, metadata), best first
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def is_initialized(self) -> bool:
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        return None
@@ -0,0 +1,70 @@
+'''
+    Worker warm-up and readiness.
+
+    A fresh worker process (start or worker_max_tasks_per_child recycle) loads GPT-2 and the
+    embedding model and runs one dummy inference through each before it takes messages, so no
+    user message pays for from_pretrained or a cold first forward pass.
+
+    Readiness is reported with WORKER_READY_FILE, written by the first process that is warm
+    and removed on worker shutdown (e.g. `test -f /tmp/neuro_chat_worker.ready` as a healthcheck).
+    A process whose warm-up fails removes the file and exits without taking messages;
+    with WORKER_WARMUP disabled the file is never written.
+'''
+from app.core.config import settings
+from app.core.embeddings_config import embeddings
+from app.core.llm import llm_service
+from app.utils.executors import run_inference
+from app.utils.logger import get_logger
+
+import os
+import time
+
+logger = get_logger("warmup")
+
+
+async def warm_up_embeddings() -> None:
+    model = embeddings.hf if embeddings.is_initialized() else await embeddings.initialize_embeddings()
+    started = time.perf_counter()
+    # Same call as the embedding batcher, the cache is bypassed on purpose
+    vectors = await run_inference(model.embed_documents, [getattr(model, "query_instruction", "") + "warm up"])
+    if len(vectors[0]) != embeddings.dimension:
+        logger.warning(f"Embedding dimension {len(vectors[0])} does not match the configured {embeddings.dimension}")
+    logger.info(f"Embeddings warm in {time.perf_counter() - started:.2f}s")
+
+
+async def warm_up_llm() -> None:
+    started = time.perf_counter()
+    await llm_service.initialize_model()
+    logger.info(f"GPT-2 loaded in {time.perf_counter() - started:.2f}s")
+
+    started = time.perf_counter()
+    await run_inference(llm_service.warm_up)
+    if settings.LLM_MAX_BATCH_SIZE > 1 or settings.LLM_BULK_MAX_BATCH_SIZE > 1:
+        # Batched generation runs other shapes (padding, attention masks)
+        await run_inference(llm_service.generate_batch, [{"user_message": "Hello"}, {"user_message": "How are you?"}], max_new_tokens=8)
+    logger.info(f"GPT-2 warm in {time.perf_counter() - started:.2f}s")
+
+
+async def warm_up_models() -> None:
+    """
+    Load the embedding model and GPT-2 and run a dummy inference through each.
+    Raises on failure, a process that cannot load its models should not take messages.
+    """
+    await warm_up_embeddings()
+    await warm_up_llm()
+
+
+def mark_ready() -> None:
+    """
+    Report the worker as ready to take messages.
+    """
+    with open(settings.WORKER_READY_FILE, "w") as ready_file:
+        ready_file.write(str(os.getpid()))
+    logger.info(f"Worker process {os.getpid()} ready")
+
+
+def clear_ready() -> None:
+    try:
+        os.remove(settings.WORKER_READY_FILE)
+    except FileNotFoundError:
+        pass
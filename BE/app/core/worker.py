@@ -1,13 +1,21 @@
 from app.core.config import settings
 from app.utils.logger import get_logger
 from app.utils.db_connect import mongodb
-from app.core.celery_worker_service import process_message_inside_task_queue
-from app.core.pinecone_config import pinecone
+from app.utils.db_indexes import ensure_indexes
+from app.core.celery_worker_service import MessageRetryError, process_message_inside_task_queue, process_messages_inside_task_queue
+from app.core.vector_store import vector_store
 from app.core.embeddings_config import embeddings
+from app.core.write_coalescer import write_coalescer
+from app.core.task_queues import INTERACTIVE, PRIORITY_CLASSES, queue_names
+from app.core.warmup import clear_ready, mark_ready, warm_up_models
 
 from celery import Celery
-from celery.signals import worker_process_init
+from kombu import Queue
+from celery.signals import worker_init, worker_process_init, worker_process_shutdown, worker_shutdown
+from typing import List, Optional
 import asyncio
+import os
+import threading
 
 logger = get_logger("worker")
 
@@ -20,10 +28,14 @@ celery = Celery(
 # Configure Celery settings
 celery.conf.update(
     # Worker settings
-    worker_concurrency=1,  # Number of worker processes
+    # WORKER_TASK_CONCURRENCY > 1 runs that many tasks per process on the threads pool,
+    # all sharing the process event loop (scale processes with more worker instances)
+    worker_pool="threads" if settings.WORKER_TASK_CONCURRENCY > 1 else "prefork",
+    worker_concurrency=settings.WORKER_TASK_CONCURRENCY,  # Number of worker processes (prefork) or threads (threads pool)
     worker_prefetch_multiplier=1,  # How many tasks a worker can reserve
     task_acks_late=True,  # Acknowledge tasks after they complete
     worker_max_tasks_per_child=1000,  # Restart workers after N tasks (prevents memory leaks)
+    worker_proc_alive_timeout=300,  # Seconds a new child may take in worker_process_init (model warm-up)
     
     # Task settings
     task_serializer='json',
@@ -34,60 +46,188 @@ celery.conf.update(
     
     # Result backend settings
     result_expires=3600,  # Results expire after 1 hour
+
+    # Queues: interactive and bulk priority classes, sharded by user (see task_queues).
+    # A worker started without -Q consumes all of them, start one worker per class
+    # with -Q to size each class separately.
+    task_queues=[Queue(name) for priority in PRIORITY_CLASSES for name in queue_names(priority)],
+    task_default_queue=queue_names(INTERACTIVE)[0],
 )
 
 logger.info("Starting DB Connection in Celery Tasks")
-'''
-    Used To Connect Mongo in Celery Tasks
-    Celery is Synchronous by default and therefore has to use asyncio
-    In FastAPI the async-await uses asyncio under the hood, but is managed by uvicorn
 
-    Will be called when Celery App is started
-'''
-@worker_process_init.connect
-def init_worker(**kwargs):
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    
+
+class WorkerEventLoop:
+    """
+    Long-lived event loop of a worker process, running in a background thread.
+    Celery tasks are synchronous, they submit their coroutine to this loop and wait for it.
+    All tasks of the process share the loop, so Motor / Redis clients stay bound to one loop
+    and several messages can be in flight at once (embedding and GPT-2 batches can fill up).
+    """
+
+    def __init__(self):
+        self.loop: asyncio.AbstractEventLoop | None = None
+        self.thread: threading.Thread | None = None
+        self.pid: int | None = None
+
+    def start(self):
+        # A forked child inherits the parent's attributes but not its threads
+        if self.loop is not None and self.pid == os.getpid():
+            return
+        self.pid = os.getpid()
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self._run_forever, name="worker-event-loop", daemon=True)
+        self.thread.start()
+
+    def _run_forever(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def run(self, coroutine, timeout: Optional[float] = None):
+        """
+        Run a coroutine on the loop and block the calling thread until it completes.
+        """
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result(timeout)
+
+
+worker_loop = WorkerEventLoop()
+_init_lock = threading.Lock()
+_initialized_pid = None
+
+
+async def initialize_resources():
+    """
+    Connect MongoDB, Vector Store and Embeddings on the running event loop.
+    Shared by the Celery worker and the asyncio consumer (app.core.async_consumer).
+    """
     # Initialize MongoDB connection
-    loop.run_until_complete(mongodb.connect())
+    await mongodb.connect()
     logger.info("DB Connected in Celery Tasks")
+    if settings.ENSURE_INDEXES_ON_STARTUP:
+        try:
+            await ensure_indexes()
+        except Exception as e:
+            logger.error(f"Failed to ensure indexes: {str(e)}")
     
-    # Initialize Pinecone connection
+    # Initialize Vector Store connection (Pinecone or local)
     try:
-        if not pinecone.is_initialized():
-            loop.run_until_complete(pinecone.initialize_connection())
-            logger.info("Pinecone Connected in Celery Tasks")
+        if not vector_store.is_initialized():
+            await vector_store.initialize_connection()
+            logger.info(f"Vector Store ({settings.VECTOR_STORE_BACKEND}) Connected in Celery Tasks")
         else:
-            logger.info("Pinecone already initialized in Celery Tasks")
+            logger.info("Vector Store already initialized in Celery Tasks")
     except Exception as e:
-        logger.error(f"Failed to initialize Pinecone connection: {str(e)}")
+        logger.error(f"Failed to initialize Vector Store connection: {str(e)}")
     
     # Initialize Embeddings config
     try:
         if not embeddings.is_initialized():
-            loop.run_until_complete(embeddings.initialize_embeddings())
+            await embeddings.initialize_embeddings()
             logger.info("Embeddings Config Initialized in Celery Tasks")
         else:
             logger.info("Embeddings already initialized in Celery Tasks")
     except Exception as e:
         logger.error(f"Failed to initialize embeddings config: {str(e)}")
+    
+    # Load GPT-2 and run a dummy inference through both models, report ready only then
+    if not settings.WORKER_WARMUP:
+        logger.info("Model warm-up disabled, worker not reported ready")
+        return
+    try:
+        await warm_up_models()
+    except Exception as e:
+        # A ready file written by another (or a previous) process must not report this one ready
+        logger.error(f"Model warm-up failed, worker not reported ready: {str(e)}")
+        clear_ready()
+        raise
+    mark_ready()
+
+
+def initialize_worker_process():
+    """
+    Start the process event loop and initialize resources on it.
+    Runs once per process.
+    """
+    global _initialized_pid
+    with _init_lock:
+        if _initialized_pid == os.getpid():
+            return
+        worker_loop.start()
+        worker_loop.run(initialize_resources())
+        _initialized_pid = os.getpid()
 
-@celery.task
-def process_message_task(message_id : str):
-    async def safe_wrapper():
-        return await process_message_inside_task_queue(message_id)
+'''
+    Used To Connect Mongo in Celery Tasks
+    Celery is Synchronous by default and therefore has to use asyncio
+    In FastAPI the async-await uses asyncio under the hood, but is managed by uvicorn
 
+    Will be called when Celery App is started (prefork pool, once per child process)
+    A child only gets tasks once this returned, so recycled children warm up without delaying messages
+    A child that cannot warm up exits instead of taking tasks cold
+    (Celery logs and ignores exceptions raised by signal handlers, SystemExit is not ignored)
+'''
+@worker_process_init.connect
+def init_worker(**kwargs):
     try:
-        loop = asyncio.get_event_loop()
-        if loop.is_running():
-            # If already running (e.g., inside a thread, Jupyter), create a new one
-            new_loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(new_loop)
-            return new_loop.run_until_complete(safe_wrapper())
-        else:
-            return loop.run_until_complete(safe_wrapper())
-    except RuntimeError:
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        return loop.run_until_complete(safe_wrapper())
\ No newline at end of file
+        initialize_worker_process()
+    except Exception as e:
+        raise SystemExit(f"Worker process initialization failed: {str(e)}") from e
+
+'''
+    The threads pool has no worker_process_init, initialize the main process before it consumes
+'''
+@worker_init.connect
+def init_threads_worker(**kwargs):
+    if celery.conf.worker_pool == "threads":
+        try:
+            initialize_worker_process()
+        except Exception as e:
+            raise SystemExit(f"Worker initialization failed: {str(e)}") from e
+
+'''
+    Flush the writes still buffered by the write coalescer before the process exits
+    (prefork children get worker_process_shutdown, the threads pool runs in the main process)
+'''
+@worker_process_shutdown.connect
+@worker_shutdown.connect
+def flush_worker_writes(**kwargs):
+    if _initialized_pid != os.getpid():
+        return
+    try:
+        worker_loop.run(write_coalescer.flush(), timeout=30)
+        logger.info("Flushed buffered writes on shutdown")
+    except Exception as e:
+        logger.error(f"Failed to flush buffered writes on shutdown: {str(e)}")
+
+@worker_shutdown.connect
+def report_not_ready(**kwargs):
+    clear_ready()
+
+def retry_delay(error: MessageRetryError, retries: int) -> float:
+    """
+    Delay before delivering the messages again: until their lease expires when another attempt
+    holds it, otherwise exponential backoff after a transient error, capped.
+    """
+    if error.countdown is not None:
+        return error.countdown
+    return min(settings.MESSAGE_RETRY_MAX_DELAY_SECONDS, 2 ** retries)
+
+@celery.task(bind=True, max_retries=settings.MESSAGE_MAX_RETRIES)
+def process_message_task(self, message_id : str):
+    initialize_worker_process()
+    try:
+        return worker_loop.run(process_message_inside_task_queue(message_id))
+    except MessageRetryError as e:
+        # Nothing was recorded for the message, publish it again instead of acknowledging it as done
+        logger.warning(f"Retrying message {message_id}: {str(e)}")
+        raise self.retry(exc=e, countdown=retry_delay(e, self.request.retries))
+
+@celery.task(bind=True, max_retries=settings.MESSAGE_MAX_RETRIES)
+def process_messages_task(self, message_ids : List[str]):
+    initialize_worker_process()
+    try:
+        return worker_loop.run(process_messages_inside_task_queue(message_ids))
+    except MessageRetryError as e:
+        # Only the messages that could not be claimed, the others are recorded
+        logger.warning(f"Retrying {len(e.message_ids)} of {len(message_ids)} messages: {str(e)}")
+        raise self.retry(args=(e.message_ids,), exc=e, countdown=retry_delay(e, self.request.retries))
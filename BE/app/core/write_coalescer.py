@@ -0,0 +1,89 @@
+from app.core.config import settings
+from app.core.vector_store import vector_store
+from app.core.vector_store_base import VectorStoreManager
+from app.dtos.collection_names import CollectionNames
+from app.utils.db_query import MongoQueryApplicator
+from app.utils.logger import get_logger
+from app.utils.micro_batcher import MicroBatcher
+
+from typing import Any, Dict, List, Tuple, Union
+
+logger = get_logger("write_coalescer")
+
+
+class WriteCoalescer:
+    """
+    Buffers the result writes of the message pipelines running in a worker process.
+    Message updates are sent as one Mongo bulk_write and vectors as one upsert per batch,
+    flushed on WRITE_COALESCING_MAX_BATCH_SIZE writes or WRITE_COALESCING_MAX_WAIT_MS.
+
+    A write call returns only once its batch is stored, so the task completes (and its broker
+    message is acknowledged) after its writes are durable. A crash before that redelivers it.
+    """
+
+    def __init__(self, collection_name: str, vectors: VectorStoreManager, max_batch_size: int, max_wait_ms: float):
+        self.collection_name = collection_name
+        self.vectors = vectors
+        self.update_batcher = MicroBatcher(
+            self._write_updates,
+            max_batch_size=max_batch_size,
+            max_wait_ms=max_wait_ms,
+            name="write_coalescer_updates"
+        )
+        self.vector_batcher = MicroBatcher(
+            self._upsert_vectors,
+            max_batch_size=max_batch_size,
+            max_wait_ms=max_wait_ms,
+            name="write_coalescer_vectors"
+        )
+
+    async def _write_updates(self, updates: List[Tuple[Dict[str, Any], Dict[str, Any]]]) -> List[Union[Exception, bool]]:
+        mongo = MongoQueryApplicator(self.collection_name)
+        errors, matched = await mongo.bulk_update(updates)
+        logger.info(f"Flushed {len(updates)} message updates in one bulk_write")
+        results: List[Union[Exception, bool]] = [error if error is not None else True for error in errors]
+        if matched < sum(error is None for error in errors):
+            # Some filters matched nothing (e.g. a lease taken over by another owner), find which
+            for index, (filters, _) in enumerate(updates):
+                if errors[index] is None and not await mongo.exists(filters):
+                    results[index] = False
+        return results
+
+    async def _upsert_vectors(self, vectors: List[Dict[str, Any]]) -> List[None]:
+        await self.vectors.upsert_vectors(vectors)
+        logger.info(f"Flushed {len(vectors)} vectors in one upsert")
+        return [None] * len(vectors)
+
+    async def update_one(self, filters: Dict[str, Any], update_data: Dict[str, Any]) -> bool:
+        """
+        Buffer an update_one ($set) and wait until its batch is written.
+        Returns:
+            bool: True if the update was applied, False if its filters matched no document
+        Raises:
+            Exception: The write error of this update, or the error of the whole batch
+        """
+        result = await self.update_batcher.submit((filters, update_data))
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    async def upsert_vector(self, vector: Dict[str, Any]) -> None:
+        """
+        Buffer a vector upsert and wait until its batch is upserted.
+        """
+        await self.vector_batcher.submit(vector)
+
+    async def flush(self) -> None:
+        """
+        Wait for every buffered write to be stored, called on shutdown.
+        """
+        await self.update_batcher.drain()
+        await self.vector_batcher.drain()
+
+
+write_coalescer = WriteCoalescer(
+    CollectionNames.CHAT.value,
+    vector_store,
+    max_batch_size=settings.WRITE_COALESCING_MAX_BATCH_SIZE,
+    max_wait_ms=settings.WRITE_COALESCING_MAX_WAIT_MS
+)
@@ -12,6 +12,7 @@ class ErrorAndSuccessCodes(Enum):
     # Processing Status
     MESSAGE_UNDER_PROCESSING = 5
     MESSAGE_PROCESSING_SUCCESS = 6
+    MESSAGE_IN_PROGRESS = 8  # Claimed by a worker, see processing_owner and lease_expires_at
 
     #Error
     PROCESSING_ERROR = 7
\ No newline at end of file
@@ -23,6 +23,8 @@ class MessageList(BaseModel):
 class GetChatResponse(BaseModel): 
     status : str
     data : List[MessageList]
+    next_cursor : Optional[str] = None  # Pass as `cursor` to fetch the next page, None on the last page
+    internal_status_code : Optional[ErrorAndSuccessCodes] = None
 
 
 class SendMessageRequest(BaseModel):
@@ -38,6 +40,15 @@ class SendMessageResponse(BaseModel):
     system_response: str
     internal_status_code: Optional[ErrorAndSuccessCodes] = None
 
+class SendMessagesRequest(BaseModel):
+    """Send Messages (bulk) Request DTO"""
+    messages: List[SendMessageRequest]
+
+
+class SendMessagesResponse(NeuroChatResponse):
+    """Send Messages (bulk) Response DTO, one item per request message in the same order"""
+    data: List[SendMessageResponse]
+
 class GetMessagesStatusRequest(BaseModel):
     """Get Messages Status Request DTO"""
     user_id: str
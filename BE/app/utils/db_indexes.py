@@ -0,0 +1,32 @@
+from app.dtos.collection_names import CollectionNames
+from app.utils.db_connect import mongodb
+from app.utils.logger import get_logger
+
+from pymongo import ASCENDING, IndexModel
+
+logger = get_logger("db_indexes")
+
+'''
+    Indexes needed by the queries of neuro_chat_service and celery_worker_service.
+    Lookups by _id (users, message validation, getMessagesStatus, related messages)
+    use the default _id index.
+'''
+INDEXES = {
+    CollectionNames.CHAT.value: [
+        # getChat: {user_id} sorted by (created_at, _id), page_number and cursor pagination
+        IndexModel(
+            [("user_id", ASCENDING), ("created_at", ASCENDING), ("_id", ASCENDING)],
+            name="user_id_created_at_id"
+        ),
+    ],
+}
+
+
+async def ensure_indexes() -> None:
+    """
+    Create the indexes the application queries rely on.
+    Idempotent, existing indexes are left untouched.
+    """
+    for collection_name, indexes in INDEXES.items():
+        created = await mongodb.db[collection_name].create_indexes(indexes)
+        logger.info(f"Indexes ensured on {collection_name}: {created}")
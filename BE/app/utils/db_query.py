@@ -1,27 +1,89 @@
 # services/query_applicator.py
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 from app.utils.db_connect import mongodb
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, WriteError
 
 class MongoQueryApplicator:
     def __init__(self, collection_name: str):
         self.collection = mongodb.db[collection_name]
 
-    async def find(self, filters: Optional[Dict[str, Any]] = None, limit: int = 10) -> List[Dict]:
+    async def find(self, filters: Optional[Dict[str, Any]] = None, limit: int = 10,
+                   projection: Optional[Dict[str, Any]] = None) -> List[Dict]:
         filters = filters or {}
-        cursor = self.collection.find(filters).limit(limit)
+        cursor = self.collection.find(filters, projection).limit(limit)
         return await cursor.to_list(length=limit)
 
-    async def find_one(self, filters: Dict[str, Any]) -> Optional[Dict]:
-        return await self.collection.find_one(filters)
+    async def find_one(self, filters: Dict[str, Any], projection: Optional[Dict[str, Any]] = None) -> Optional[Dict]:
+        return await self.collection.find_one(filters, projection)
+
+    async def exists(self, filters: Dict[str, Any]) -> bool:
+        """
+        Check if a document matches, fetching nothing but its _id.
+        """
+        return await self.collection.find_one(filters, {"_id": 1}) is not None
+
+    async def find_ids(self, filters: Optional[Dict[str, Any]] = None, limit: int = 10) -> List[Any]:
+        """
+        _ids of the matching documents, nothing else is fetched.
+        """
+        filters = filters or {}
+        cursor = self.collection.find(filters, {"_id": 1}).limit(limit)
+        return [document["_id"] for document in await cursor.to_list(length=limit)]
 
     async def insert_one(self, document: Dict[str, Any]) -> str:
         result = await self.collection.insert_one(document)
         return str(result.inserted_id)
 
+    async def insert_many(self, documents: List[Dict[str, Any]]) -> List[str]:
+        """
+        Insert documents in one round trip, returns their _ids in input order.
+        """
+        result = await self.collection.insert_many(documents)
+        return [str(inserted_id) for inserted_id in result.inserted_ids]
+
     async def update_one(self, filters: Dict[str, Any], update_data: Dict[str, Any]) -> int:
         result = await self.collection.update_one(filters, {'$set': update_data})
         return result.modified_count
 
+    async def update_many(self, filters: Dict[str, Any], update_data: Dict[str, Any]) -> int:
+        result = await self.collection.update_many(filters, {'$set': update_data})
+        return result.modified_count
+
+    async def bulk_update(self, updates: List[Tuple[Dict[str, Any], Dict[str, Any]]]) -> Tuple[List[Optional[Exception]], int]:
+        """
+        Apply several update_one ($set) in one unordered bulk_write round trip.
+        
+        Args:
+            updates: (filters, update_data) pairs
+        Returns:
+            One entry per update (None when executed, its WriteError otherwise) and the number of
+            documents the updates matched
+        """
+        results: List[Optional[Exception]] = [None] * len(updates)
+        try:
+            result = await self.collection.bulk_write(
+                [UpdateOne(filters, {'$set': update_data}) for filters, update_data in updates],
+                ordered=False
+            )
+            matched = result.matched_count
+        except BulkWriteError as e:
+            for error in e.details.get("writeErrors", []):
+                results[error["index"]] = WriteError(error.get("errmsg"), error.get("code"), error)
+            matched = e.details.get("nMatched", 0)
+        return results, matched
+
+    async def find_one_and_update(self, filters: Dict[str, Any], update_data: Dict[str, Any],
+                                  projection: Optional[Dict[str, Any]] = None) -> Optional[Dict]:
+        """
+        Atomically update ($set) the first matching document.
+        Returns:
+            The updated document, None if nothing matched
+        """
+        return await self.collection.find_one_and_update(
+            filters, {'$set': update_data}, projection=projection, return_document=ReturnDocument.AFTER
+        )
+
     async def delete_one(self, filters: Dict[str, Any]) -> int:
         result = await self.collection.delete_one(filters)
         return result.deleted_count
@@ -32,7 +94,8 @@ class MongoQueryApplicator:
 
     async def find_paginated(self, filters: Optional[Dict[str, Any]] = None, 
                             skip: int = 0, limit: int = 10, 
-                            sort_field: str = None, sort_order: int = 1) -> List[Dict]:
+                            sort_field: str = None, sort_order: int = 1,
+                            projection: Optional[Dict[str, Any]] = None) -> List[Dict]:
         """
         Find documents with pagination and sorting support.
         
@@ -42,11 +105,40 @@ class MongoQueryApplicator:
             limit: Maximum number of documents to return
             sort_field: Field to sort by
             sort_order: 1 for ascending, -1 for descending
+            projection: Fields to return, None for the whole document
         """
         filters = filters or {}
-        cursor = self.collection.find(filters).skip(skip).limit(limit)
+        cursor = self.collection.find(filters, projection).skip(skip).limit(limit)
         
         if sort_field:
             cursor = cursor.sort(sort_field, sort_order)
             
-        return await cursor.to_list(length=limit)
\ No newline at end of file
+        return await cursor.to_list(length=limit)
+
+    async def find_after(self, filters: Optional[Dict[str, Any]] = None,
+                         sort_field: str = "created_at", after: Optional[Tuple[Any, Any]] = None,
+                         limit: int = 10, sort_order: int = 1,
+                         projection: Optional[Dict[str, Any]] = None) -> List[Dict]:
+        """
+        Keyset (cursor) pagination: documents strictly after `after` in (sort_field, _id) order.
+        Uses range predicates instead of skip, so every page costs the same
+        (with an index on the filter fields + sort_field + _id).
+        
+        Args:
+            filters: Query filters
+            sort_field: Field to sort by, _id breaks ties
+            after: (sort_field value, _id) of the last document of the previous page, None for the first page
+            limit: Maximum number of documents to return
+            sort_order: 1 for ascending, -1 for descending
+            projection: Fields to return, None for the whole document
+        """
+        filters = dict(filters or {})
+        if after is not None:
+            after_value, after_id = after
+            operator = "$gt" if sort_order == 1 else "$lt"
+            filters = {"$and": [filters, {"$or": [
+                {sort_field: {operator: after_value}},
+                {sort_field: after_value, "_id": {operator: after_id}}
+            ]}]}
+        cursor = self.collection.find(filters, projection).sort([(sort_field, sort_order), ("_id", sort_order)]).limit(limit)
+        return await cursor.to_list(length=limit)
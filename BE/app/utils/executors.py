@@ -0,0 +1,37 @@
+from app.core.config import settings
+
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable
+import asyncio
+
+'''
+    Dedicated executors for blocking calls made from the event loop.
+    io_executor: blocking network clients (Pinecone), many threads
+    inference_executor: model forward passes (GPT-2, embeddings), few threads,
+        torch already parallelizes each forward pass across cores
+    stream_executor: waits on GPT-2 token streamers, one thread per stream being generated,
+        kept apart from io_executor so streams never hold the threads of vector store calls
+'''
+io_executor = ThreadPoolExecutor(max_workers=settings.BLOCKING_IO_THREADS, thread_name_prefix="blocking-io")
+inference_executor = ThreadPoolExecutor(max_workers=settings.INFERENCE_THREADS, thread_name_prefix="inference")
+stream_executor = ThreadPoolExecutor(
+    max_workers=max(settings.WORKER_TASK_CONCURRENCY, settings.INTERACTIVE_CONCURRENCY, settings.INFERENCE_THREADS),
+    thread_name_prefix="stream"
+)
+
+
+async def run_blocking(fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """
+    Run a blocking I/O call on the io executor without blocking the event loop.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(io_executor, partial(fn, *args, **kwargs))
+
+
+async def run_inference(fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """
+    Run a model call on the inference executor without blocking the event loop.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(inference_executor, partial(fn, *args, **kwargs))
@@ -1,6 +1,9 @@
-from typing import List
+from typing import List, Optional, Tuple
 from bson import ObjectId
+from datetime import datetime
 from app.utils.logger import get_logger
+import base64
+import json
 
 logger = get_logger("generic_utils")
 
@@ -13,4 +16,26 @@ def convert_string_ids_to_object_ids(ids: List[str]) -> List[ObjectId]:
         except Exception as e:
             logger.warning(f"Invalid ObjectId format: {msg_id}, skipping")
             continue
-    return object_ids
\ No newline at end of file
+    return object_ids
+
+
+def encode_page_cursor(created_at: datetime, document_id: ObjectId) -> str:
+    """
+    Opaque pagination cursor for the (created_at, _id) position of a document.
+    """
+    payload = json.dumps({"created_at": created_at.isoformat(), "_id": str(document_id)})
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+
+
+def decode_page_cursor(cursor: str) -> Optional[Tuple[datetime, ObjectId]]:
+    """
+    Decode a cursor created by encode_page_cursor.
+    Returns:
+        (created_at, _id), None if the cursor is invalid
+    """
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return datetime.fromisoformat(payload["created_at"]), ObjectId(payload["_id"])
+    except Exception as e:
+        logger.warning(f"Invalid pagination cursor: {cursor}, {e}")
+        return None
@@ -1,10 +1,11 @@
-from dotenv import load_dotenv, get_key
+from dotenv import load_dotenv, dotenv_values
+import os
 import sys
 from loguru import logger
 
 load_dotenv()
 # Configure logger
-LOG_LEVEL = get_key(".env", "LOG_LEVEL")
+LOG_LEVEL = os.getenv("LOG_LEVEL") or dotenv_values(".env").get("LOG_LEVEL") or "INFO"
 
 # Remove default handler
 logger.remove()
@@ -0,0 +1,107 @@
+from app.utils.logger import get_logger
+
+from typing import Any, Awaitable, Callable, List, Optional, Tuple
+import asyncio
+
+logger = get_logger("micro_batcher")
+
+
+class MicroBatcher:
+    """
+    Collects items submitted concurrently on the event loop and processes them together.
+    A batch is flushed once it holds `max_batch_size` items or `max_wait_ms` has passed
+    since its first item arrived. Every submitter gets back the result for its own item.
+    """
+
+    def __init__(
+        self,
+        process_batch: Callable[[List[Any]], Awaitable[List[Any]]],
+        max_batch_size: int,
+        max_wait_ms: float,
+        name: str = "micro_batcher"
+    ):
+        """
+        Args:
+            process_batch: Coroutine function returning one result per item, in the same order
+            max_batch_size: Maximum number of items processed together
+            max_wait_ms: Maximum time the first item of a batch waits for more items
+            name: Name used in logs
+        """
+        self.process_batch = process_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self.name = name
+        self.queue: Optional[asyncio.Queue] = None
+        self.runner: Optional[asyncio.Task] = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _ensure_running(self) -> None:
+        """
+        Start the batching loop on the current event loop
+        (restarted if the worker replaced its event loop).
+        """
+        loop = asyncio.get_running_loop()
+        if self.loop is loop and self.runner is not None and not self.runner.done():
+            return
+        self.loop = loop
+        self.queue = asyncio.Queue()
+        self.runner = loop.create_task(self._run())
+
+    def enqueue(self, item: Any) -> asyncio.Future:
+        """
+        Queue an item for the next batch.
+        Must be called from a coroutine running on the event loop.
+        Returns:
+            asyncio.Future: Resolved with the item's result, or with the exception process_batch raised
+        """
+        self._ensure_running()
+        future = self.loop.create_future()
+        self.queue.put_nowait((item, future))
+        return future
+
+    async def submit(self, item: Any) -> Any:
+        """
+        Submit an item and wait for its result.
+        """
+        return await self.enqueue(item)
+
+    async def drain(self) -> None:
+        """
+        Wait until every item queued so far has been processed.
+        """
+        if self.queue is not None and self.runner is not None and not self.runner.done():
+            await self.queue.join()
+
+    async def _collect(self) -> List[Tuple[Any, asyncio.Future]]:
+        batch = [await self.queue.get()]
+        deadline = self.loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - self.loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout=timeout))
+            except asyncio.TimeoutError:
+                break
+        # Anything already queued joins the batch without waiting
+        while len(batch) < self.max_batch_size and not self.queue.empty():
+            batch.append(self.queue.get_nowait())
+        return batch
+
+    async def _run(self) -> None:
+        while True:
+            batch = await self._collect()
+            items = [item for item, _ in batch]
+            try:
+                results = await self.process_batch(items)
+                for (_, future), result in zip(batch, results):
+                    if not future.done():
+                        future.set_result(result)
+            except Exception as e:
+                logger.error(f"Error processing batch of {len(items)} in {self.name}: {str(e)}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
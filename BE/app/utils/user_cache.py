@@ -0,0 +1,145 @@
+from app.core.config import settings
+from app.dtos.collection_names import CollectionNames
+from app.utils.db_query import MongoQueryApplicator
+
+from bson import ObjectId
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Iterable, List, Set, Tuple
+import asyncio
+import time
+
+
+async def user_exists_in_db(user_id: str) -> bool:
+    mongo = MongoQueryApplicator(CollectionNames.USERS.value)
+    return await mongo.exists({"_id": ObjectId(user_id)})
+
+
+async def users_existing_in_db(user_ids: List[str]) -> Set[str]:
+    mongo = MongoQueryApplicator(CollectionNames.USERS.value)
+    found = await mongo.find_ids({"_id": {"$in": [ObjectId(user_id) for user_id in user_ids]}}, limit=len(user_ids))
+    return {str(user_id) for user_id in found}
+
+
+class UserExistenceCache:
+    """
+    In-process cache of user existence checks.
+    Bounded LRU with TTL. Unknown users are cached too (negative entries) with a shorter TTL,
+    so a user created meanwhile is picked up quickly.
+    Concurrent misses for one user share a single query (single-flight).
+    """
+
+    def __init__(self, loader: Callable[[str], Awaitable[bool]], bulk_loader: Callable[[List[str]], Awaitable[Set[str]]],
+                 max_entries: int, ttl_seconds: float, negative_ttl_seconds: float):
+        self.loader = loader
+        self.bulk_loader = bulk_loader
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.negative_ttl_seconds = negative_ttl_seconds
+        # user_id -> (exists, expires_at)
+        self.entries: "OrderedDict[str, Tuple[bool, float]]" = OrderedDict()
+        self.in_flight: Dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _lookup(self, user_id: str):
+        entry = self.entries.get(user_id)
+        if entry is None:
+            return None
+        exists, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self.entries[user_id]
+            return None
+        self.entries.move_to_end(user_id)
+        return exists
+
+    def _store(self, user_id: str, exists: bool) -> None:
+        ttl = self.ttl_seconds if exists else self.negative_ttl_seconds
+        self.entries[user_id] = (exists, time.monotonic() + ttl)
+        self.entries.move_to_end(user_id)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    async def exists(self, user_id: str) -> bool:
+        """
+        Check if a user exists, querying the DB only on a cache miss.
+        Raises:
+            Exception: Whatever the loader raised (e.g. invalid ObjectId), nothing is cached then
+        """
+        cached = self._lookup(user_id)
+        if cached is not None:
+            self.hits += 1
+            return cached
+
+        self.misses += 1
+        pending = self.in_flight.get(user_id)
+        if pending is not None:
+            try:
+                return await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                if not pending.cancelled():
+                    raise
+                # The query was cancelled with the request that started it, not this one: query again
+                return await self.exists(user_id)
+
+        future = asyncio.get_running_loop().create_future()
+        self.in_flight[user_id] = future
+        try:
+            exists = await self.loader(user_id)
+            self._store(user_id, exists)
+            future.set_result(exists)
+            return exists
+        except Exception as e:
+            future.set_exception(e)
+            # Retrieved by waiters, if any; avoids "exception was never retrieved" warnings
+            future.exception()
+            raise
+        finally:
+            # Cancelled during the query (request cancelled or timed out): release the waiters
+            if not future.done():
+                future.cancel()
+            del self.in_flight[user_id]
+
+    async def exists_many(self, user_ids: Iterable[str]) -> Dict[str, bool]:
+        """
+        Check several users at once, the ones not cached are fetched in a single query.
+        Returns:
+            Dict of user_id -> exists, one entry per distinct user_id
+        """
+        results: Dict[str, bool] = {}
+        missing: List[str] = []
+        for user_id in dict.fromkeys(user_ids):
+            cached = self._lookup(user_id)
+            if cached is None:
+                missing.append(user_id)
+            else:
+                results[user_id] = cached
+        self.hits += len(results)
+        self.misses += len(missing)
+
+        if missing:
+            found = await self.bulk_loader(missing)
+            for user_id in missing:
+                results[user_id] = user_id in found
+                self._store(user_id, results[user_id])
+        return results
+
+    def invalidate(self, user_id: str) -> None:
+        self.entries.pop(user_id, None)
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self.entries)
+        }
+
+
+user_cache = UserExistenceCache(
+    user_exists_in_db,
+    users_existing_in_db,
+    max_entries=settings.USER_CACHE_SIZE,
+    ttl_seconds=settings.USER_CACHE_TTL_SECONDS,
+    negative_ttl_seconds=settings.USER_CACHE_NEGATIVE_TTL_SECONDS
+)
@@ -0,0 +1,103 @@
+'''
+    Vector parity, encode latency and memory of the BGE-small embedding backends.
+
+    Run from BE/:
+        python -m benchmarks.embedding_backends --backends int8 onnx
+
+    Every text is embedded as a query (instruction prepended, like the embedding batcher) by
+    sentence_transformers (reference) and by each backend. Parity is the cosine similarity to
+    the reference vector of the same text, vectors must be 384-d with unit norm.
+    Exits with status 1 if any vector is below --min-cosine (EMBEDDINGS_PARITY_MIN_COSINE by default).
+    Memory is the growth of the process RSS while loading a backend, models are loaded one after
+    the other in this process, so run one backend at a time for exact numbers.
+'''
+from app.core.embedding_backends import EMBEDDINGS_PARITY_MIN_COSINE, load_embedding_model
+from app.core.embeddings_config import embeddings
+from benchmarks.llm_batching import SAMPLE_QUESTIONS, SAMPLE_CONTEXT
+
+import argparse
+import statistics
+import sys
+import time
+import numpy as np
+import psutil
+
+
+def sample_texts(count: int):
+    texts = SAMPLE_QUESTIONS + [pair["system"] for pair in SAMPLE_CONTEXT] + [
+        "Could you give me a detailed, step by step explanation of how the message processing pipeline "
+        "stores embeddings and retrieves the previous conversation used as context for a new answer?"
+    ]
+    return [texts[i % len(texts)] + ("" if i < len(texts) else f" ({i})") for i in range(count)]
+
+
+def load(backend: str):
+    process = psutil.Process()
+    rss = process.memory_info().rss
+    started = time.perf_counter()
+    model, loaded = load_embedding_model(backend, embeddings.model_name, embeddings.model_kwargs, embeddings.encode_kwargs)
+    load_seconds = time.perf_counter() - started
+    rss_mb = (process.memory_info().rss - rss) / 2 ** 20
+    print(f"{backend}: loaded in {load_seconds:.2f}s, +{rss_mb:.0f} MB RSS (backend in use: {loaded})")
+    return model, rss_mb
+
+
+def run_backend(model, texts, batch_size: int):
+    queries = [model.query_instruction + text for text in texts]
+    model.embed_documents(queries[:2])
+
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        model.embed_documents([query])
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    vectors = []
+    for offset in range(0, len(queries), batch_size):
+        vectors.extend(model.embed_documents(queries[offset:offset + batch_size]))
+    throughput = len(queries) / (time.perf_counter() - start)
+    return np.asarray(vectors, dtype=np.float32), latencies, throughput
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", nargs="+", default=["int8", "onnx"])
+    parser.add_argument("--texts", type=int, default=64)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--min-cosine", type=float, default=EMBEDDINGS_PARITY_MIN_COSINE)
+    args = parser.parse_args()
+
+    texts = sample_texts(args.texts)
+    backends = ["sentence_transformers"] + [backend for backend in args.backends if backend != "sentence_transformers"]
+
+    results = {}
+    for backend in backends:
+        model, rss_mb = load(backend)
+        results[backend] = run_backend(model, texts, args.batch_size) + (rss_mb,)
+        del model
+
+    reference, reference_latencies, reference_throughput, _ = results["sentence_transformers"]
+    reference_latency = statistics.mean(reference_latencies)
+    print(f"\n{'backend':<22} {'dim':>4} {'min cos':>8} {'mean cos':>9} {'latency':>9} {'speedup':>8} {'texts/sec':>10} {'speedup':>8} {'RSS MB':>7}")
+    failed = False
+    for backend, (vectors, latencies, throughput, rss_mb) in results.items():
+        norms = np.linalg.norm(vectors, axis=1)
+        if vectors.shape[1] != embeddings.dimension or not np.allclose(norms, 1.0, atol=1e-3):
+            print(f"{backend}: expected unit norm {embeddings.dimension}-d vectors, got shape {vectors.shape}")
+            failed = True
+        cosines = np.sum(vectors * reference, axis=1) / (norms * np.linalg.norm(reference, axis=1))
+        latency = statistics.mean(latencies)
+        print(
+            f"{backend:<22} {vectors.shape[1]:>4} {cosines.min():>8.4f} {cosines.mean():>9.4f} {latency * 1000:>7.1f}ms "
+            f"x{reference_latency / latency:>7.2f} {throughput:>10.1f} x{throughput / reference_throughput:>7.2f} {rss_mb:>7.0f}"
+        )
+        failed = failed or cosines.min() < args.min_cosine
+
+    if failed:
+        print(f"\nParity check failed (min cosine {args.min_cosine})")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
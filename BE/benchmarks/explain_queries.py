@@ -0,0 +1,87 @@
+'''
+    Query plan check: runs explain() on every query shape used by neuro_chat_service and
+    celery_worker_service and fails if any of them falls back to a COLLSCAN.
+
+    Run from BE/ against the configured MongoDB (indexes are ensured first):
+        python -m benchmarks.explain_queries
+
+    Keep QUERY_SHAPES in sync with the queries of the services.
+'''
+from app.dtos.collection_names import CollectionNames
+from app.dtos.error_success_codes import ErrorAndSuccessCodes
+from app.utils.db_connect import mongodb
+from app.utils.db_indexes import ensure_indexes
+
+from bson import ObjectId
+from datetime import datetime
+import asyncio
+import sys
+
+USER_ID = ObjectId()
+MESSAGE_IDS = [ObjectId() for _ in range(5)]
+CREATED_AT = datetime.now()
+
+CHAT = CollectionNames.CHAT.value
+USERS = CollectionNames.USERS.value
+
+# (name, collection, filter, sort)
+QUERY_SHAPES = [
+    ("user_cache: user exists (cache miss)", USERS, {"_id": USER_ID}, None),
+    ("get_user_messages: page_number", CHAT, {"user_id": USER_ID}, [("created_at", 1)]),
+    ("get_user_messages: cursor", CHAT, {"$and": [{"user_id": USER_ID}, {"$or": [
+        {"created_at": {"$gt": CREATED_AT}},
+        {"created_at": CREATED_AT, "_id": {"$gt": MESSAGE_IDS[0]}}
+    ]}]}, [("created_at", 1), ("_id", 1)]),
+    ("get_messages_status", CHAT, {"_id": {"$in": MESSAGE_IDS}, "user_id": USER_ID}, None),
+    ("claim_message", CHAT, {"_id": MESSAGE_IDS[0], "$or": [
+        {"system_message_status": ErrorAndSuccessCodes.MESSAGE_UNDER_PROCESSING.value},
+        {"system_message_status": ErrorAndSuccessCodes.MESSAGE_IN_PROGRESS.value, "lease_expires_at": {"$lt": CREATED_AT}}
+    ]}, None),
+    ("get_related_messages", CHAT, {"_id": {"$in": MESSAGE_IDS}, "user_id": USER_ID}, None),
+    ("find_semantic_cache_hit", CHAT, {
+        "_id": MESSAGE_IDS[0],
+        "system_message_status": ErrorAndSuccessCodes.MESSAGE_PROCESSING_SUCCESS.value,
+        "user_id": USER_ID
+    }, None),
+    ("process_message_inside_task_queue: update", CHAT, {"_id": MESSAGE_IDS[0], "processing_owner": "owner"}, None),
+]
+
+
+def find_stages(plan, stages=None):
+    """
+    Collect every stage name of a query plan (classic and slot based engine formats).
+    """
+    stages = stages if stages is not None else []
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            stages.append(plan["stage"])
+        for value in plan.values():
+            find_stages(value, stages)
+    elif isinstance(plan, list):
+        for value in plan:
+            find_stages(value, stages)
+    return stages
+
+
+async def main() -> int:
+    await mongodb.connect()
+    await ensure_indexes()
+
+    failures = 0
+    for name, collection, filters, sort in QUERY_SHAPES:
+        cursor = mongodb.db[collection].find(filters)
+        if sort:
+            cursor = cursor.sort(sort)
+        explanation = await cursor.explain()
+        stages = find_stages(explanation["queryPlanner"]["winningPlan"])
+        status = "COLLSCAN" if "COLLSCAN" in stages else "ok"
+        failures += status != "ok"
+        print(f"{status:<9} {name:<45} {' <- '.join(stages)}")
+
+    await mongodb.close()
+    print(f"{failures} queries fall back to COLLSCAN" if failures else "All queries use an index")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
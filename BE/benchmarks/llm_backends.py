@@ -0,0 +1,119 @@
+'''
+    Greedy parity and speed of the GPT-2 inference backends against eager.
+
+    Run from BE/:
+        python -m benchmarks.llm_backends --backends eager int8 compile onnx
+        python -m benchmarks.llm_backends --backends int8 --min-agreement 0.8   # overrides the threshold
+
+    Every prompt is decoded greedily with a fixed number of new tokens on each backend.
+    Parity is measured against eager, per prompt, as the share of new tokens generated before
+    the first differing token (1.0 = identical output):
+        compile and onnx run the same float32 math and must stay at 1.0,
+        int8 changes the logits slightly and diverges earlier on some prompts.
+    Exits with status 1 if a backend's mean agreement is below its LLM_PARITY_MIN_AGREEMENT threshold
+    (app.core.llm_backends), or below --min-agreement when given.
+    Latency is one message at a time, throughput uses batched generation (--batch-size).
+'''
+from app.core.config import settings
+from app.core.llm import LLMService
+from app.core.llm_backends import LLM_PARITY_MIN_AGREEMENT
+from benchmarks.llm_batching import build_prompts
+
+import argparse
+import statistics
+import sys
+import time
+import asyncio
+import torch
+
+
+def generate_greedy(service: LLMService, prompts, max_new_tokens: int) -> torch.Tensor:
+    inputs = service._prepare_inputs(prompts, max_new_tokens)
+    outputs = service._generate(
+        **inputs,
+        max_new_tokens=max_new_tokens,
+        min_new_tokens=max_new_tokens,
+        do_sample=False,
+        pad_token_id=service.tokenizer.eos_token_id
+    )
+    return outputs[:, inputs["input_ids"].shape[1]:]
+
+
+def load_service(backend: str) -> LLMService:
+    settings.LLM_BACKEND = backend
+    service = LLMService()
+    started = time.perf_counter()
+    asyncio.run(service.initialize_model())
+    print(f"{backend}: loaded in {time.perf_counter() - started:.2f}s (backend in use: {service.backend})")
+    # First calls allocate buffers, compile traces its first shapes
+    generate_greedy(service, build_prompts(1), 4)
+    return service
+
+
+def agreement(reference, candidate) -> float:
+    common = 0
+    for expected, actual in zip(reference, candidate):
+        if expected != actual:
+            break
+        common += 1
+    return common / len(reference)
+
+
+def run_backend(service: LLMService, prompts, max_new_tokens: int, batch_size: int):
+    outputs, latencies = [], []
+    for prompt in prompts:
+        start = time.perf_counter()
+        outputs.append(generate_greedy(service, [prompt], max_new_tokens)[0].tolist())
+        latencies.append(time.perf_counter() - start)
+
+    generated = 0
+    start = time.perf_counter()
+    for offset in range(0, len(prompts), batch_size):
+        generated += generate_greedy(service, prompts[offset:offset + batch_size], max_new_tokens).numel()
+    throughput = generated / (time.perf_counter() - start)
+    return outputs, latencies, throughput
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", nargs="+", default=["eager", "int8", "compile", "onnx"])
+    parser.add_argument("--messages", type=int, default=8)
+    parser.add_argument("--max-new-tokens", type=int, default=32)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--min-agreement", type=float, default=None,
+                        help="Fail below this mean agreement with eager, for every backend (default: LLM_PARITY_MIN_AGREEMENT)")
+    args = parser.parse_args()
+
+    prompts = build_prompts(args.messages)
+    backends = ["eager"] + [backend for backend in args.backends if backend != "eager"]
+
+    results = {}
+    for backend in backends:
+        service = load_service(backend)
+        results[backend] = run_backend(service, prompts, args.max_new_tokens, args.batch_size)
+        del service
+
+    reference, reference_latencies, reference_throughput = results["eager"]
+    reference_latency = statistics.mean(reference_latencies)
+    print(f"\n{'backend':<10} {'identical':>10} {'agreement':>10} {'minimum':>8} {'latency':>10} {'speedup':>8} {'tokens/sec':>11} {'speedup':>8}")
+    failed = []
+    for backend, (outputs, latencies, throughput) in results.items():
+        scores = [agreement(expected, actual) for expected, actual in zip(reference, outputs)]
+        identical = sum(score == 1.0 for score in scores)
+        mean_agreement = statistics.mean(scores)
+        latency = statistics.mean(latencies)
+        minimum = args.min_agreement if args.min_agreement is not None else LLM_PARITY_MIN_AGREEMENT.get(backend, 1.0)
+        print(
+            f"{backend:<10} {identical:>6}/{len(scores):<3} {mean_agreement:>10.3f} {minimum:>8.2f} {latency:>9.3f}s "
+            f"x{reference_latency / latency:>7.2f} {throughput:>11.1f} x{throughput / reference_throughput:>7.2f}"
+        )
+        if mean_agreement < minimum:
+            failed.append(backend)
+
+    if failed:
+        print(f"\nMean agreement below the threshold for: {', '.join(failed)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
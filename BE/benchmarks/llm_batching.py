@@ -0,0 +1,102 @@
+'''
+    Tokens/sec of the per-message GPT-2 path vs batched generation.
+
+    Run from BE/:
+        python -m benchmarks.llm_batching --messages 16 --batch-sizes 1 4 8 16
+        python -m benchmarks.llm_batching --no-prefix-cache   # preamble prefilled on every call
+
+    Both paths use greedy decoding with a fixed number of new tokens,
+    so they do exactly the same amount of decoding work.
+'''
+from app.core.llm import llm_service
+
+import argparse
+import asyncio
+import time
+import torch
+
+SAMPLE_QUESTIONS = [
+    "What is the capital of France?",
+    "How do I reset my password?",
+    "Can you explain what a vector database is?",
+    "thanks",
+    "What did we talk about yesterday regarding the deployment?",
+    "hi",
+    "How long does it take to process a message?",
+    "Summarize our previous conversation about embeddings.",
+]
+
+SAMPLE_CONTEXT = [
+    {"user": "What is Pinecone?", "system": "Pinecone is a managed vector database used for similarity search."},
+    {"user": "Which model creates the embeddings?", "system": "Embeddings are created with BAAI/bge-small-en-v1.5."},
+]
+
+
+def build_prompts(count: int):
+    return [(SAMPLE_QUESTIONS[i % len(SAMPLE_QUESTIONS)], SAMPLE_CONTEXT) for i in range(count)]
+
+
+def run_per_message(prompts, max_new_tokens: int) -> int:
+    generated = 0
+    for prompt in prompts:
+        inputs = llm_service._prepare_inputs([prompt], max_new_tokens)
+        with torch.no_grad():
+            outputs = llm_service.model.generate(
+                **inputs,
+                max_new_tokens=max_new_tokens,
+                min_new_tokens=max_new_tokens,
+                do_sample=False,
+                pad_token_id=llm_service.tokenizer.eos_token_id
+            )
+        generated += outputs.shape[1] - inputs["input_ids"].shape[1]
+    return generated
+
+
+def run_batched(prompts, max_new_tokens: int, batch_size: int) -> int:
+    generated = 0
+    for start in range(0, len(prompts), batch_size):
+        inputs = llm_service._prepare_inputs(prompts[start:start + batch_size], max_new_tokens)
+        with torch.no_grad():
+            outputs = llm_service.model.generate(
+                **inputs,
+                max_new_tokens=max_new_tokens,
+                min_new_tokens=max_new_tokens,
+                do_sample=False,
+                pad_token_id=llm_service.tokenizer.eos_token_id
+            )
+        generated += (outputs.shape[1] - inputs["input_ids"].shape[1]) * outputs.shape[0]
+    return generated
+
+
+def measure(name: str, fn, *args):
+    start = time.perf_counter()
+    tokens = fn(*args)
+    elapsed = time.perf_counter() - start
+    print(f"{name:<24} {tokens:>6} tokens  {elapsed:>8.2f}s  {tokens / elapsed:>8.1f} tokens/sec")
+    return tokens / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=16)
+    parser.add_argument("--max-new-tokens", type=int, default=50)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[4, 8, 16])
+    parser.add_argument("--no-prefix-cache", action="store_true", help="Prefill the preamble on every call")
+    args = parser.parse_args()
+
+    asyncio.run(llm_service.initialize_model())
+    if args.no_prefix_cache:
+        llm_service.prefix_cache = None
+    prompts = build_prompts(args.messages)
+
+    # Warm up (first forward pass allocates buffers)
+    run_per_message(prompts[:1], 2)
+
+    baseline = measure("per-message", run_per_message, prompts, args.max_new_tokens)
+    for batch_size in args.batch_sizes:
+        throughput = measure(f"batched (size {batch_size})", run_batched, prompts, args.max_new_tokens, batch_size)
+        print(f"{'':<24} speedup x{throughput / baseline:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -9,8 +9,13 @@ from app.utils.logger import get_logger
 from app.api.health import router as health_router
 from app.api.neuro_chat_endpoints import router as neuro_chat_router
 from app.utils.db_connect import mongodb
-from app.core.pinecone_config import pinecone
+from app.utils.db_indexes import ensure_indexes
+from app.core.vector_store import vector_store
 from app.core.embeddings_config import embeddings
+from app.core.pubsub import pubsub
+from app.core.rate_limiter import admission_controller
+from app.core.queue_metrics import queue_metrics
+from app.core.cache_metrics import embedding_cache_metrics
 
 logger = get_logger("main")
 
@@ -68,10 +73,16 @@ app.include_router(neuro_chat_router, prefix="/api/chat")
 async def startup_event():
     await mongodb.connect()
     logger.info("Connected to MongoDB")
+    if settings.ENSURE_INDEXES_ON_STARTUP:
+        await ensure_indexes()
 
 @app.on_event("shutdown")
 async def shutdown_event():
     await mongodb.close()
+    await pubsub.close()
+    await admission_controller.close()
+    await queue_metrics.close()
+    await embedding_cache_metrics.close()
     logger.info("Disconnected from MongoDB and Pinecone")
 
 @app.get("/")
@@ -0,0 +1,37 @@
+from app.core.config import settings
+from app.core.rate_limiter import AdmissionController, InMemoryRateLimiter, TokenBucket
+from app.core.task_queues import BULK, INTERACTIVE
+from app.dtos.error_success_codes import ErrorAndSuccessCodes
+
+import asyncio
+
+
+def make_controller() -> AdmissionController:
+    return AdmissionController(InMemoryRateLimiter(), metrics=None)
+
+
+def test_cost_above_capacity_is_never_admitted_by_the_limiter():
+    limiter = InMemoryRateLimiter()
+    bucket = TokenBucket("test:user", rate=1000, capacity=5)
+    assert asyncio.run(limiter.acquire([bucket], cost=6)) == 0
+    assert asyncio.run(limiter.acquire([bucket], cost=5)) is None
+
+
+def test_batch_above_burst_is_rejected_up_front(monkeypatch):
+    monkeypatch.setattr(settings, "RATE_LIMIT_BULK_USER_PER_SECOND", 1.0)
+    monkeypatch.setattr(settings, "RATE_LIMIT_BULK_USER_BURST", 10.0)
+    controller = make_controller()
+    assert asyncio.run(controller.check_rate("user", 11, BULK)) == ErrorAndSuccessCodes.INVALID_INPUT
+    # Nothing was charged by the rejected batch
+    assert asyncio.run(controller.check_rate("user", 10, BULK)) is None
+
+
+def test_bulk_batch_larger_than_interactive_burst_is_admitted(monkeypatch):
+    monkeypatch.setattr(settings, "RATE_LIMIT_USER_BURST", 5.0)
+    monkeypatch.setattr(settings, "RATE_LIMIT_GLOBAL_BURST", 100.0)
+    monkeypatch.setattr(settings, "RATE_LIMIT_BULK_USER_BURST", float(settings.BULK_MAX_MESSAGES))
+    monkeypatch.setattr(settings, "RATE_LIMIT_BULK_GLOBAL_BURST", float(settings.BULK_MAX_MESSAGES))
+    controller = make_controller()
+    assert asyncio.run(controller.check_rate("user", settings.BULK_MAX_MESSAGES, BULK)) is None
+    # Bulk tokens do not come out of the interactive buckets
+    assert asyncio.run(controller.check_rate("user", 1, INTERACTIVE)) is None
@@ -0,0 +1,56 @@
+import asyncio
+import pytest
+
+pytest.importorskip("motor")
+
+from app.utils.user_cache import UserExistenceCache  # noqa: E402
+
+
+def make_cache(loader) -> UserExistenceCache:
+    async def bulk_loader(user_ids):
+        return set()
+    return UserExistenceCache(loader, bulk_loader, max_entries=10, ttl_seconds=60, negative_ttl_seconds=5)
+
+
+def test_waiter_queries_again_when_the_leader_is_cancelled():
+    calls = []
+
+    async def loader(user_id):
+        calls.append(user_id)
+        if len(calls) == 1:
+            await asyncio.sleep(10)
+        return True
+
+    async def scenario():
+        cache = make_cache(loader)
+        leader = asyncio.create_task(cache.exists("user"))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(cache.exists("user"))
+        await asyncio.sleep(0)
+        leader.cancel()
+        result = await asyncio.wait_for(waiter, timeout=1)
+        assert leader.cancelled()
+        assert cache.in_flight == {}
+        return result
+
+    assert asyncio.run(scenario()) is True
+    assert len(calls) == 2
+
+
+def test_cancelled_waiter_does_not_cancel_the_query():
+    async def loader(user_id):
+        await asyncio.sleep(0.05)
+        return True
+
+    async def scenario():
+        cache = make_cache(loader)
+        leader = asyncio.create_task(cache.exists("user"))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(cache.exists("user"))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        return await leader, waiter
+
+    result, waiter = asyncio.run(scenario())
+    assert result is True
+    assert waiter.cancelled()
@@ -10,14 +10,17 @@ const chatAPI = axios.create({
 });
 
 // Get chat messages with pagination
-export const getChat = async (userId, pageNumber = 1) => {
+// Pass the next_cursor of the previous response as cursor to fetch the following page
+export const getChat = async (userId, pageNumber = 1, cursor = null) => {
   try {
-    const response = await chatAPI.get(`/api/chat/getChat`, {
-      params: {
-        user_id: userId,
-        page_number: pageNumber,
-      },
-    });
+    const params = {
+      user_id: userId,
+      page_number: pageNumber,
+    };
+    if (cursor) {
+      params.cursor = cursor;
+    }
+    const response = await chatAPI.get(`/api/chat/getChat`, { params });
     return response.data;
   } catch (error) {
     console.error('Error fetching chat messages:', error);
@@ -53,7 +56,33 @@ export const getMessagesStatus = async (userId, messageIds) => {
   }
 };
 
-// Utility function to poll for message status
+// Subscribe to message status updates pushed by the server (Server-Sent Events)
+// onToken receives partial system responses while the message is being generated
+// Returns the EventSource, call close() on it to unsubscribe
+export const subscribeToMessageStatus = (userId, onStatus, onReady, onError, onToken) => {
+  const source = new EventSource(
+    `${API_BASE_URL}/api/chat/streamMessagesStatus?user_id=${encodeURIComponent(userId)}`
+  );
+  source.addEventListener('ready', () => onReady && onReady());
+  source.addEventListener('message_status', (event) => {
+    try {
+      onStatus(JSON.parse(event.data));
+    } catch (error) {
+      console.error('Error parsing message status event:', error);
+    }
+  });
+  source.addEventListener('message_token', (event) => {
+    try {
+      onToken && onToken(JSON.parse(event.data));
+    } catch (error) {
+      console.error('Error parsing message token event:', error);
+    }
+  });
+  source.onerror = (error) => onError && onError(error);
+  return source;
+};
+
+// Utility function to poll for message status (fallback when the status stream is unavailable)
 export const pollForMessageStatus = async (userId, messageId, maxRetries = 10, interval = 10000) => {
   return new Promise((resolve, reject) => {
     let retryCount = 0;
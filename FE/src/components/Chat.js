@@ -1,5 +1,5 @@
 import React, { useState, useEffect, useRef } from 'react';
-import { getChat, sendMessage, pollForMessageStatus } from '../api/chatService';
+import { getChat, sendMessage, pollForMessageStatus, subscribeToMessageStatus } from '../api/chatService';
 import './Chat.css';
 
 const Chat = () => {
@@ -9,6 +9,12 @@ const Chat = () => {
   const [isLoadingHistory, setIsLoadingHistory] = useState(true);
   const [processingMessages, setProcessingMessages] = useState(new Set());
   const messagesEndRef = useRef(null);
+  const statusStreamReady = useRef(false);
+  // Statuses pushed before the sendMessage response was handled
+  const pushedStatuses = useRef(new Map());
+  // Messages waiting for a response, and those already being polled
+  const processingRef = useRef(new Set());
+  const pollingMessages = useRef(new Set());
   
   // Hardcoded user ID as requested
   const USER_ID = '68714a69df9144af1173a76b'; // Example MongoDB ObjectId format
@@ -18,15 +24,86 @@ const Chat = () => {
     scrollToBottom();
   }, [messages]);
 
+  useEffect(() => {
+    processingRef.current = processingMessages;
+  }, [processingMessages]);
+
   // Load chat history on component mount
   useEffect(() => {
     loadChatHistory();
   }, []);
 
+  // Subscribe to pushed message statuses on component mount
+  useEffect(() => {
+    const source = subscribeToMessageStatus(
+      USER_ID,
+      (messageStatus) => {
+        pushedStatuses.current.set(messageStatus.message_id, messageStatus);
+        applyMessageStatus(messageStatus.message_id, messageStatus);
+      },
+      () => { statusStreamReady.current = true; },
+      () => {
+        // Statuses pushed while the stream is down (or reconnecting) are lost, poll them instead
+        statusStreamReady.current = false;
+        processingRef.current.forEach(messageId => pollMessageStatus(messageId));
+      },
+      (token) => {
+        // Append partial system response while the message is being generated
+        setMessages(prev => 
+          prev.map(msg => 
+            msg.id === token.message_id && msg.system_message_status === 5
+              ? { ...msg, system_message: (msg.system_message || '') + token.text }
+              : msg
+          )
+        );
+      }
+    );
+    return () => source.close();
+  }, []);
+
   const scrollToBottom = () => {
     messagesEndRef.current?.scrollIntoView({ behavior: 'smooth' });
   };
 
+  const applyMessageStatus = (messageId, messageStatus) => {
+    setMessages(prev => 
+      prev.map(msg => 
+        msg.id === messageId 
+          ? { 
+              ...msg, 
+              system_message: messageStatus.system_response || 'No response received',
+              system_message_status: messageStatus.status 
+            }
+          : msg
+      )
+    );
+    setProcessingMessages(prev => {
+      const newSet = new Set(prev);
+      newSet.delete(messageId);
+      return newSet;
+    });
+  };
+
+  const pollMessageStatus = async (messageId) => {
+    if (pollingMessages.current.has(messageId)) return;
+    pollingMessages.current.add(messageId);
+    try {
+      const messageStatus = await pollForMessageStatus(USER_ID, messageId);
+      
+      // Update the message with the system response
+      applyMessageStatus(messageId, messageStatus);
+    } catch (pollError) {
+      console.error('Polling error:', pollError);
+      // Update message with error state
+      applyMessageStatus(messageId, {
+        system_response: 'Failed to get response. Please try again.',
+        status: 7 // PROCESSING_ERROR
+      });
+    } finally {
+      pollingMessages.current.delete(messageId);
+    }
+  };
+
   const loadChatHistory = async () => {
     try {
       setIsLoadingHistory(true);
@@ -68,45 +145,23 @@ const Chat = () => {
         };
         
         setMessages(prev => [...prev, newMessage]);
+        processingRef.current = new Set(processingRef.current).add(messageId);
         setProcessingMessages(prev => new Set(prev).add(messageId));
         
-        // Start polling for response
-        try {
-          const messageStatus = await pollForMessageStatus(USER_ID, messageId);
-          
-          // Update the message with the system response
-          setMessages(prev => 
-            prev.map(msg => 
-              msg.id === messageId 
-                ? { 
-                    ...msg, 
-                    system_message: messageStatus.system_response || 'No response received',
-                    system_message_status: messageStatus.status 
-                  }
-                : msg
-            )
-          );
-        } catch (pollError) {
-          console.error('Polling error:', pollError);
-          // Update message with error state
-          setMessages(prev => 
-            prev.map(msg => 
-              msg.id === messageId 
-                ? { 
-                    ...msg, 
-                    system_message: 'Failed to get response. Please try again.',
-                    system_message_status: 7 // PROCESSING_ERROR
-                  }
-                : msg
-            )
-          );
-        } finally {
-          setProcessingMessages(prev => {
-            const newSet = new Set(prev);
-            newSet.delete(messageId);
-            return newSet;
-          });
+        // Response already pushed by the server
+        if (pushedStatuses.current.has(messageId)) {
+          applyMessageStatus(messageId, pushedStatuses.current.get(messageId));
+          pushedStatuses.current.delete(messageId);
+          return;
         }
+
+        // Response will be pushed through the status stream
+        if (statusStreamReady.current) {
+          return;
+        }
+        
+        // Fallback: poll for response
+        await pollMessageStatus(messageId);
       } else {
         alert('Failed to send message. Please try again.');
       }
@@ -128,6 +183,7 @@ const Chat = () => {
   const getMessageStatusText = (status) => {
     switch (status) {
       case 5: return 'Processing...';
+      case 8: return 'Processing...';
       case 6: return 'Completed';
       case 7: return 'Error';
       default: return 'Unknown';
@@ -184,7 +240,7 @@ const Chat = () => {
                   <div className="message-content">
                     <strong>System:</strong> {
                       processingMessages.has(message.id) 
-                        ? 'Processing your message...' 
+                        ? (message.system_message || 'Processing your message...')
                         : message.system_message
                     }
                   </div>